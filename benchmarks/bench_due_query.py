@@ -0,0 +1,122 @@
+"""
+Benchmark the queries that find due triggers, without and with the partial indexes of migration 0009.
+
+A database is seeded with a large trigger table (mostly processed triggers spread over many types), and the due
+trigger queries of process_triggers and clean_triggers are timed after migrating to 0008 and to 0009.
+
+Usage:
+    python benchmarks/bench_due_query.py [--rows 1000000] [--types 80] [--pending 0.01]
+    python benchmarks/bench_due_query.py --engine postgresql --name bench --user postgres --host localhost
+
+SQLite (the default) uses a temporary database file. Note that an existing PostgreSQL database is flushed.
+"""
+from argparse import ArgumentParser
+from datetime import timedelta
+from os import remove
+from os.path import abspath, dirname, exists
+from random import Random
+from sys import path
+from tempfile import mkdtemp
+from time import perf_counter
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def seed(rows, types, pending):
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from django.utils import timezone
+
+    # The database is at migration 0008, so seed it with the model as it was then
+    state = MigrationExecutor(connection).loader.project_state(('djtriggers', '0008_trigger_claim'))
+    Trigger = state.apps.get_model('djtriggers', 'Trigger')
+
+    random = Random(0)
+    now = timezone.now()
+    batch = []
+    for i in range(rows):
+        trigger = Trigger(date_received=now - timedelta(days=60))
+        trigger.trigger_type = 'trigger_type_{}'.format(random.randrange(types))
+        if random.random() >= pending:
+            trigger.date_processed = now - timedelta(seconds=random.randrange(90 * 24 * 3600))
+            trigger.successful = True
+        elif random.random() < 0.5:
+            trigger.process_after = now + timedelta(seconds=random.randrange(-3600, 3600))
+        batch.append(trigger)
+        if len(batch) == 10000:
+            Trigger.objects.bulk_create(batch)
+            batch = []
+    Trigger.objects.bulk_create(batch)
+
+
+def time_queries(label, types, repeat):
+    from django.db import connection
+    from django.utils import timezone
+    from djtriggers.managers import due_triggers_q
+    from djtriggers.models import Trigger
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    queries = {
+        # process_triggers, per type
+        'due per type': lambda: [list(Trigger.objects.filter(due_triggers_q(), trigger_type='trigger_type_{}'.format(t))
+                                      .order_by('id').values_list('id')[:500]) for t in range(types)],
+        # process_triggers with DJTRIGGERS_SINGLE_QUERY_POLLING
+        'due all types': lambda: list(Trigger.objects.filter(due_triggers_q()).order_by('id')
+                                      .values_list('id', 'trigger_type')[:500]),
+        # clean_triggers
+        'expired': lambda: list(Trigger.objects.filter(date_processed__lt=timezone.now() - timedelta(days=60))
+                                .order_by('id').values_list('id', 'trigger_type')[:1000]),
+    }
+    for name, query in queries.items():
+        start = perf_counter()
+        for _ in range(repeat):
+            query()
+        print('{:<8} {:<14} {:>10.2f} ms'.format(label, name, (perf_counter() - start) / repeat * 1000))  # noqa: T001
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--types', type=int, default=80)
+    parser.add_argument('--pending', type=float, default=0.01, help='the fraction of unprocessed triggers')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--engine', choices=('sqlite3', 'postgresql'), default='sqlite3')
+    parser.add_argument('--name', help='the database name (PostgreSQL only)')
+    parser.add_argument('--user', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--host', default='')
+    args = parser.parse_args()
+
+    name = args.name if args.engine == 'postgresql' else '{}/bench.sqlite3'.format(mkdtemp())
+    settings.configure(
+        INSTALLED_APPS=['djtriggers'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.{}'.format(args.engine), 'NAME': name,
+                               'USER': args.user, 'PASSWORD': args.password, 'HOST': args.host}},
+        DJTRIGGERS_REDIS_URL='',
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('migrate', 'djtriggers', '0008', verbosity=0)
+    call_command('flush', interactive=False, verbosity=0)
+    start = perf_counter()
+    seed(args.rows, args.types, args.pending)
+    print('Seeded {} triggers in {:.1f} s'.format(args.rows, perf_counter() - start))  # noqa: T001
+
+    time_queries('before', args.types, args.repeat)
+    call_command('migrate', 'djtriggers', '0009', verbosity=0)
+    time_queries('after', args.types, args.repeat)
+
+    if args.engine == 'sqlite3' and exists(name):
+        remove(name)
+
+
+if __name__ == '__main__':
+    main()
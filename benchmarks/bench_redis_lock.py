@@ -0,0 +1,61 @@
+"""
+Benchmark the latency of acquiring and releasing a trigger lock with djtriggers.locking.redis_lock, comparing a new
+Redis client per lock (the old behaviour) with the shared connection pool.
+
+Usage:
+    python benchmarks/bench_redis_lock.py [--url redis://localhost:6379/0] [--iterations 5000]
+
+Without --url, an in-process fakeredis server (pip install fakeredis lupa) is used as a stand-in. That doesn't account
+for TCP connection setup, so the difference against a real Redis server is larger.
+"""
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+from sys import path
+from time import perf_counter
+
+path.insert(0, dirname(dirname(abspath(__file__))))
+
+from django.conf import settings  # noqa: E402
+
+
+def run(label, iterations):
+    from djtriggers.locking import redis_lock
+
+    start = perf_counter()
+    for i in range(iterations):
+        with redis_lock('djtriggers-bench-{}'.format(i), blocking_timeout=0, timeout=10):
+            pass
+    elapsed = perf_counter() - start
+    print('{:<10} {:>8.1f} us/lock'.format(label, elapsed / iterations * 1e6))  # noqa: T001
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='URL of the Redis server, uses fakeredis when omitted')
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    settings.configure(DJTRIGGERS_REDIS_URL=args.url or 'redis://fakeredis')
+
+    from mock import patch
+    from redis import ConnectionPool, Redis
+
+    if args.url:
+        def new_pool(**kwargs):
+            return ConnectionPool.from_url(args.url, **kwargs)
+    else:
+        from fakeredis import FakeConnection, FakeServer
+        server = FakeServer()
+
+        def new_pool(**kwargs):
+            return ConnectionPool(connection_class=FakeConnection, server=server, **kwargs)
+
+    with patch('djtriggers.locking.ConnectionPool.from_url', side_effect=lambda url, **kwargs: new_pool(**kwargs)):
+        # A new client, and thus a new pool and connection, for every lock
+        with patch('djtriggers.locking.get_redis', side_effect=lambda: Redis(connection_pool=new_pool())):
+            run('per-lock', args.iterations)
+        run('pooled', args.iterations)
+
+
+if __name__ == '__main__':
+    main()
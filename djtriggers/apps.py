@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save
+
+from .notifications import trigger_saved
+from .registry import registry
+
+
+class DjangoTriggersConfig(AppConfig):
+    name = 'djtriggers'
+    verbose_name = 'Django Triggers'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        registry.populate()
+        post_save.connect(trigger_saved, dispatch_uid='djtriggers_notify')
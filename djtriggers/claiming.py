@@ -0,0 +1,71 @@
+from datetime import timedelta
+from os import getpid
+from socket import gethostname
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .managers import due_triggers_q
+from .models import Trigger
+
+
+def get_claim_token():
+    """
+    Get a token that identifies a single claim by this worker.
+    """
+    return '{}-{}-{}'.format(gethostname()[:50], getpid(), uuid4().hex[:12])
+
+
+def claim_triggers(token, limit=None, after_id=0, lease_seconds=None, priority=None):
+    """
+    Atomically claim a batch of due triggers, so multiple workers can partition the due triggers between them.
+
+    Claimed triggers get `token` as claimed_by, and stay claimed until claimed_until. On databases that support it, the
+    candidate rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers never wait for each other
+    and never pick the same rows. Elsewhere (e.g. SQLite), a conditional update on the lease columns decides which
+    worker wins each row.
+
+    :param str token: the claim token, see get_claim_token()
+    :param int limit: the maximum number of triggers to claim. Defaults to DJTRIGGERS_CLAIM_BATCH_SIZE (100).
+    :param int after_id: only claim triggers with a higher id
+    :param int lease_seconds: how long the claim is valid. Defaults to DJTRIGGERS_CLAIM_LEASE_SECONDS (300).
+    :param int priority: only claim triggers with this priority, None means any priority
+    :return: the ids and types of the claimed triggers, ordered by id
+    :rtype: list of (int, str) tuples
+    """
+    if limit is None:
+        limit = getattr(settings, 'DJTRIGGERS_CLAIM_BATCH_SIZE', 100)
+    if lease_seconds is None:
+        lease_seconds = getattr(settings, 'DJTRIGGERS_CLAIM_LEASE_SECONDS', 300)
+
+    now = timezone.now()
+    unclaimed_q = Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)
+    candidates = Trigger.objects.filter(due_triggers_q(now), unclaimed_q, id__gt=after_id).order_by('id')
+    if priority is not None:
+        candidates = candidates.filter(priority=priority)
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+
+        # The lease condition is repeated so that, without row locks, only one worker can win a row
+        Trigger.objects.filter(unclaimed_q, id__in=ids).update(claimed_by=token,
+                                                               claimed_until=now + timedelta(seconds=lease_seconds))
+
+    return list(Trigger.objects.filter(id__in=ids, claimed_by=token).order_by('id').values_list('id', 'trigger_type'))
+
+
+def release_triggers(token, ids):
+    """
+    Release the claim on triggers, so unprocessed ones can be claimed again.
+
+    :param str token: the claim token used to claim the triggers
+    :param list ids: the ids of the triggers to release
+    """
+    Trigger.objects.filter(id__in=ids, claimed_by=token).update(claimed_by=None, claimed_until=None)
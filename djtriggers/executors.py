@@ -0,0 +1,110 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from os import cpu_count
+
+import django
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+
+EXECUTORS = ('serial', 'thread', 'process')
+
+
+class SerialExecutor(Executor):
+    """
+    An executor that runs everything right away, in the calling thread.
+    """
+    max_workers = 1
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class TriggerThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A thread pool that gives back the database connection of its thread after every trigger, like Django does after
+    every request.
+    """
+    def __init__(self, max_workers):
+        super(TriggerThreadPoolExecutor, self).__init__(max_workers, thread_name_prefix='djtriggers')
+        self.max_workers = max_workers
+
+    def submit(self, fn, *args, **kwargs):
+        return super(TriggerThreadPoolExecutor, self).submit(_close_connections_after, fn, *args, **kwargs)
+
+
+class TriggerProcessPoolExecutor(ProcessPoolExecutor):
+    """
+    A process pool that starts fresh worker processes, so they don't share the database connections of the calling
+    process. Workers set up Django from DJANGO_SETTINGS_MODULE and open their own connections.
+    """
+    def __init__(self, max_workers):
+        super(TriggerProcessPoolExecutor, self).__init__(max_workers, mp_context=get_context('spawn'),
+                                                         initializer=django.setup)
+        self.max_workers = max_workers
+
+
+def _close_connections_after(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def get_executor(name=None, max_workers=None):
+    """
+    Get the executor that processes triggers synchronously (i.e. without Celery).
+
+    :param str name: 'serial' to process triggers one by one in the calling thread, 'thread' for a thread pool (for I/O
+        bound triggers) or 'process' for a process pool. Defaults to DJTRIGGERS_EXECUTOR, or 'serial'.
+    :param int max_workers: the maximum number of triggers processed concurrently. Defaults to
+        DJTRIGGERS_EXECUTOR_MAX_WORKERS, or the number of CPUs for a process pool and 4 more for a thread pool (at most
+        32).
+    :rtype: concurrent.futures.Executor
+    """
+    if name is None:
+        name = getattr(settings, 'DJTRIGGERS_EXECUTOR', 'serial')
+    if max_workers is None:
+        max_workers = getattr(settings, 'DJTRIGGERS_EXECUTOR_MAX_WORKERS', None)
+
+    if name == 'serial':
+        return SerialExecutor()
+    if name == 'thread':
+        return TriggerThreadPoolExecutor(max_workers or min(32, (cpu_count() or 1) + 4))
+    if name == 'process':
+        return TriggerProcessPoolExecutor(max_workers or cpu_count() or 1)
+    raise ImproperlyConfigured('Unknown trigger executor {}, use one of {}'.format(name, ', '.join(EXECUTORS)))
+
+
+def process_trigger_in_process(trigger_app_label, trigger_class, trigger_id, use_statsd=False, lock=True):
+    """
+    Process a trigger in a worker process of a process pool, which gets the trigger by id as model instances can't be
+    shared between processes. As the process lives on in the pool, it gives back broken or old database connections
+    before and after every trigger, like Django does for every request, and flushes the buffered log records and
+    metrics after every trigger.
+    """
+    from .loggers import flush_loggers
+    from .logic import _handle_trigger
+    from .metrics import metrics
+    from .models import Trigger
+    from .registry import registry
+
+    model = registry.get_model_by_name(trigger_app_label, trigger_class)
+    if model is None:
+        return
+    close_old_connections()
+    try:
+        try:
+            trigger = model.objects.get(id=trigger_id, date_processed__isnull=True)
+        except Trigger.DoesNotExist:
+            return
+        _handle_trigger(trigger, False, use_statsd, lock=lock)
+    finally:
+        flush_loggers()
+        metrics.flush()
+        close_old_connections()
@@ -1,8 +1,97 @@
-from contextlib import contextmanager
+from asyncio import get_running_loop
+from contextlib import asynccontextmanager, contextmanager
 from django.conf import settings
-from redis import Redis
+from os import getpid
+from redis import ConnectionPool, Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.lock import Lock as AsyncLock
 from redis.lock import Lock
-from typing import Generator
+from threading import Lock as ThreadLock
+from typing import AsyncGenerator, Generator, Iterable
+from uuid import uuid1
+from weakref import WeakKeyDictionary
+
+_pool = None
+_pool_key = None
+_pool_lock = ThreadLock()
+# Asyncio clients can only be used in the event loop they were created in
+_async_clients = WeakKeyDictionary()
+
+# Sets every key that isn't set yet to the token (ARGV[1]), with an optional expiry in milliseconds (ARGV[2]).
+# Returns the keys that were set.
+ACQUIRE_MANY_SCRIPT = """
+local acquired = {}
+for _, key in ipairs(KEYS) do
+    local result
+    if ARGV[2] == '' then
+        result = redis.call('set', key, ARGV[1], 'nx')
+    else
+        result = redis.call('set', key, ARGV[1], 'nx', 'px', ARGV[2])
+    end
+    if result then
+        acquired[#acquired + 1] = key
+    end
+end
+return acquired
+"""
+
+# Deletes every key that is still set to the token (ARGV[1]).
+RELEASE_MANY_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        redis.call('del', key)
+        released = released + 1
+    end
+end
+return released
+"""
+
+
+def get_redis() -> Redis:
+    """
+    Get a Redis client for DJTRIGGERS_REDIS_URL.
+
+    All clients of a process share a single connection pool, so connections are reused instead of set up for every
+    lock. The pool is recreated in forked child processes, which must not share sockets with their parent.
+
+    Relevant settings are:
+     - DJTRIGGERS_REDIS_MAX_CONNECTIONS: the maximum number of connections in the pool. The default is None, which
+       means there's no limit.
+     - DJTRIGGERS_REDIS_SOCKET_TIMEOUT: how many seconds to wait for Redis to respond. The default is None, which
+       means we wait forever.
+    """
+    global _pool, _pool_key
+
+    key = (settings.DJTRIGGERS_REDIS_URL, getpid())
+    if _pool_key != key:
+        with _pool_lock:
+            if _pool_key != key:
+                _pool = ConnectionPool.from_url(
+                    settings.DJTRIGGERS_REDIS_URL,
+                    max_connections=getattr(settings, 'DJTRIGGERS_REDIS_MAX_CONNECTIONS', None),
+                    socket_timeout=getattr(settings, 'DJTRIGGERS_REDIS_SOCKET_TIMEOUT', None),
+                )
+                _pool_key = key
+    return Redis(connection_pool=_pool)
+
+
+def get_async_redis() -> AsyncRedis:
+    """
+    Get an asyncio Redis client for DJTRIGGERS_REDIS_URL. This is the asyncio version of get_redis(), with a
+    connection pool for every event loop.
+    """
+    key = (settings.DJTRIGGERS_REDIS_URL, getpid())
+    loop = get_running_loop()
+    client, client_key = _async_clients.get(loop, (None, None))
+    if client_key != key:
+        client = AsyncRedis.from_url(
+            settings.DJTRIGGERS_REDIS_URL,
+            max_connections=getattr(settings, 'DJTRIGGERS_REDIS_MAX_CONNECTIONS', None),
+            socket_timeout=getattr(settings, 'DJTRIGGERS_REDIS_SOCKET_TIMEOUT', None),
+        )
+        _async_clients[loop] = (client, key)
+    return client
 
 
 @contextmanager
@@ -19,7 +108,49 @@ def redis_lock(name: str, **kwargs) -> Generator:
     Raises redis.exceptions.LockError if the lock couldn't be acquired or released.
     """
     if settings.DJTRIGGERS_REDIS_URL.startswith('redis'):  # pragma: no cover
-        with Lock(redis=Redis.from_url(settings.DJTRIGGERS_REDIS_URL), name=name, **kwargs):
+        with Lock(redis=get_redis(), name=name, **kwargs):
             yield
     else:
         yield
+
+
+@asynccontextmanager
+async def aredis_lock(name: str, **kwargs) -> AsyncGenerator:
+    """
+    Acquire a Redis lock from asyncio code. This is the asyncio version of redis_lock(), and takes the same kwargs.
+
+    Raises redis.exceptions.LockError if the lock couldn't be acquired or released.
+    """
+    if settings.DJTRIGGERS_REDIS_URL.startswith('redis'):  # pragma: no cover
+        async with AsyncLock(redis=get_async_redis(), name=name, **kwargs):
+            yield
+    else:
+        yield
+
+
+@contextmanager
+def redis_locks(names: Iterable[str], timeout: float = None) -> Generator:
+    """
+    Acquire many Redis locks at once, in a single round trip, without waiting for the locks that are held by someone
+    else. Yields the set of names of the locks that were acquired, which are released again (in a single round trip
+    too) on exit. This also works in tests (there, all locks are always granted without any checks).
+
+    The locks use the same keys as redis_lock(), so both can be mixed.
+
+    Relevant kwargs are:
+     - timeout: how many seconds to keep the locks for. The default is None, which means they remain locked forever.
+    """
+    names = list(names)
+    if names and settings.DJTRIGGERS_REDIS_URL.startswith('redis'):
+        redis = get_redis()
+        token = uuid1().hex
+        expiry = '' if timeout is None else str(int(timeout * 1000))
+        acquired = {name.decode() if isinstance(name, bytes) else name
+                    for name in redis.register_script(ACQUIRE_MANY_SCRIPT)(keys=names, args=[token, expiry])}
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                redis.register_script(RELEASE_MANY_SCRIPT)(keys=list(acquired), args=[token])
+    else:
+        yield set(names)
@@ -1,20 +1,29 @@
 from django.conf import settings
-try:
-    from django.urls import get_mod_func
-except ImportError:
-    # For Django <2.0
-    from django.core.urlresolvers import get_mod_func
+from django.urls import get_mod_func
 
 REGISTRY = {}
 
 loggers = getattr(settings, 'DJTRIGGERS_LOGGERS', ())
+# The class names of the loggers that write their records in a background thread
+background_loggers = getattr(settings, 'DJTRIGGERS_BACKGROUND_LOGGERS', ())
 
 for entry in loggers:
     module_name, class_name = get_mod_func(entry)
     logger_class = getattr(__import__(module_name, {}, {}, ['']), class_name)
     instance = logger_class()
+    if class_name in background_loggers:
+        from .background import BackgroundLogger
+        instance = BackgroundLogger(instance)
     REGISTRY[class_name] = instance
 
 
 def get_logger(slug):
     return REGISTRY.get(slug, None)
+
+
+def flush_loggers():
+    """
+    Flush all loggers of DJTRIGGERS_LOGGERS.
+    """
+    for logger in REGISTRY.values():
+        logger.flush()
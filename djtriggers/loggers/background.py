@@ -0,0 +1,120 @@
+from atexit import register
+from logging import getLogger
+from os import getpid
+from queue import Full, Queue
+from random import random
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+
+from djtriggers.loggers.base import TriggerLogger
+
+logger = getLogger(__name__)
+
+FULL_POLICIES = ('block', 'drop', 'sample')
+
+
+class BackgroundLogger(TriggerLogger):
+    """
+    Wraps another logger, so its records are written by a background thread instead of slowing down processing.
+
+    Records go through a queue of DJTRIGGERS_BACKGROUND_LOGGER_QUEUE_SIZE (1000) records. When it's full,
+    DJTRIGGERS_BACKGROUND_LOGGER_FULL_POLICY decides what happens to new records:
+     - 'block' (the default): wait until there's room.
+     - 'drop': drop the record.
+     - 'sample': wait for a DJTRIGGERS_BACKGROUND_LOGGER_SAMPLE_RATE (0.1) fraction of the records, and drop the rest.
+
+    The loggers of DJTRIGGERS_LOGGERS that are in DJTRIGGERS_BACKGROUND_LOGGERS are wrapped automatically.
+    """
+    def __init__(self, logger, max_size=None, full_policy=None, sample_rate=None):
+        """
+        :param TriggerLogger logger: the logger that writes the records
+        :param int max_size: the maximum number of records in the queue
+        :param str full_policy: what to do when the queue is full: 'block', 'drop' or 'sample'
+        :param float sample_rate: the fraction of the records to keep when the queue is full, with 'sample'
+        """
+        self.logger = logger
+        self.max_size = max_size or getattr(settings, 'DJTRIGGERS_BACKGROUND_LOGGER_QUEUE_SIZE', 1000)
+        self.full_policy = full_policy or getattr(settings, 'DJTRIGGERS_BACKGROUND_LOGGER_FULL_POLICY', 'block')
+        if self.full_policy not in FULL_POLICIES:
+            raise ImproperlyConfigured('Unknown policy {} for a full logger queue, use one of {}'.format(
+                self.full_policy, ', '.join(FULL_POLICIES)))
+        self.sample_rate = sample_rate if sample_rate is not None else \
+            getattr(settings, 'DJTRIGGERS_BACKGROUND_LOGGER_SAMPLE_RATE', 0.1)
+        self.dropped = 0
+        self._lock = Lock()
+        self._queue = None
+        self._pid = None
+        register(self.close)
+
+    def log_result(self, trigger, message, level=None):
+        self._put(('log_result', trigger, message, level))
+
+    def log_message(self, trigger, message, level=None):
+        self._put(('log_message', trigger, message, level))
+
+    def flush(self, wait=False, timeout=None):
+        """
+        Flush the wrapped logger once the records that are queued now have been written.
+
+        :param bool wait: whether to wait until that's done
+        :param float timeout: the maximum number of seconds to wait
+        :return: whether it's done
+        :rtype: bool
+        """
+        # Nothing was logged (in this process)
+        if self._pid != getpid():
+            return True
+
+        done = Event()
+        self._queue.put(done)
+        return done.wait(timeout) if wait else False
+
+    def close(self):
+        """
+        Write all queued records, waiting at most DJTRIGGERS_BACKGROUND_LOGGER_EXIT_TIMEOUT (10) seconds. This is
+        called when the process exits.
+        """
+        if not self.flush(wait=True, timeout=getattr(settings, 'DJTRIGGERS_BACKGROUND_LOGGER_EXIT_TIMEOUT', 10)):
+            logger.warning('Not all trigger log records were written before exiting')
+
+    def _get_queue(self):
+        # Threads don't survive a fork, so every process starts its own writer thread
+        if self._pid != getpid():
+            with self._lock:
+                if self._pid != getpid():
+                    self._queue = Queue(self.max_size)
+                    Thread(target=self._write, args=(self._queue,), name='djtriggers-logger', daemon=True).start()
+                    self._pid = getpid()
+        return self._queue
+
+    def _put(self, record):
+        queue = self._get_queue()
+        if self.full_policy == 'block' or (self.full_policy == 'sample' and random() < self.sample_rate):
+            queue.put(record)
+            return
+
+        try:
+            queue.put_nowait(record)
+        except Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _write(self, queue):
+        while True:
+            record = queue.get()
+            try:
+                if isinstance(record, Event):
+                    self.logger.flush()
+                    # Like Django does after every request
+                    close_old_connections()
+                else:
+                    method, trigger, message, level = record
+                    getattr(self.logger, method)(trigger, message, level=level)
+            except Exception:
+                logger.exception('Writing a trigger log record failed')
+            finally:
+                if isinstance(record, Event):
+                    record.set()
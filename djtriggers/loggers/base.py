@@ -15,3 +15,9 @@ class TriggerLogger(object):
         Log any message during the processing of a trigger.
         """
         pass
+
+    def flush(self):
+        """
+        Write out whatever the logger buffered. This is called at the end of every batch of triggers.
+        """
+        pass
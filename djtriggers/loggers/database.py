@@ -1,12 +1,17 @@
+from atexit import register
 from logging import log, info
+from threading import Lock
+
+from django.conf import settings
 
 from djtriggers.loggers.base import TriggerLogger
+from djtriggers.results import get_result_encoding
 
 
 class DatabaseLogger(TriggerLogger):
     def log_result(self, trigger, message, level=None):
         from djtriggers.models import TriggerResult
-        TriggerResult.objects.create(trigger=trigger, result=message)
+        TriggerResult.from_result(trigger, message).save()
 
     def log_message(self, trigger, message, level=None):
         if level:
@@ -16,6 +21,14 @@ class DatabaseLogger(TriggerLogger):
 
 
 def _prettify(results):
+    # Results stored as JSON keep their structure, iterables like generators are stored as lists
+    if get_result_encoding() == 'json':
+        if isinstance(results, (str, bytes, dict, list)):
+            return results
+        try:
+            return list(results)
+        except TypeError:
+            return results
     try:
         return '\n'.join([str(r) for r in results])
     except TypeError:
@@ -28,4 +41,41 @@ class DatabaseSerializeLogger(DatabaseLogger):
             return
 
         from djtriggers.models import TriggerResult
-        TriggerResult.objects.create(trigger=trigger, result=_prettify(results))
+        TriggerResult.from_result(trigger, _prettify(results)).save()
+
+
+class BufferedDatabaseLogger(DatabaseLogger):
+    """
+    A DatabaseLogger that keeps the results in memory, and saves them with a single INSERT when the batch of triggers
+    is done, when DJTRIGGERS_LOGGER_BUFFER_SIZE (500) results are buffered, or when the process exits.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.results = []
+        register(self.flush)
+
+    def log_result(self, trigger, message, level=None):
+        self._buffer(trigger, message)
+
+    def _buffer(self, trigger, result):
+        from djtriggers.models import TriggerResult
+        with self.lock:
+            self.results.append(TriggerResult.from_result(trigger, result))
+            full = len(self.results) >= getattr(settings, 'DJTRIGGERS_LOGGER_BUFFER_SIZE', 500)
+        if full:
+            self.flush()
+
+    def flush(self):
+        from djtriggers.models import TriggerResult
+        with self.lock:
+            results, self.results = self.results, []
+        if results:
+            TriggerResult.objects.bulk_create(results)
+
+
+class BufferedDatabaseSerializeLogger(BufferedDatabaseLogger):
+    def log_result(self, trigger, results, level=None):
+        if results is None:
+            return
+
+        self._buffer(trigger, _prettify(results))
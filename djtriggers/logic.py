@@ -1,71 +1,540 @@
-from inspect import isabstract
+from asgiref.sync import sync_to_async
+from asyncio import Semaphore, gather
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from itertools import islice
 from logging import getLogger
+from time import sleep
 
 from dateutil.relativedelta import relativedelta
 
 from django.apps import apps
 from django.conf import settings
-from django.db import connections
-from django.db.models import Q
+from django.db import connections, transaction
+from django.db.models import Max
 from django.utils import timezone
 
 from .models import Trigger
+from .claiming import claim_triggers, get_claim_token, release_triggers
 from .exceptions import ProcessError, ProcessLaterError
-from .tasks import process_trigger
+from .executors import SerialExecutor, get_executor, process_trigger_in_process
+from .locking import redis_locks
+from .loggers import flush_loggers
+from .managers import due_triggers_q
+from .metrics import metrics
+from .registry import registry
+from .tasks import process_trigger, process_trigger_batch as process_trigger_batch_task
 
 
 logger = getLogger(__name__)
 
 
-def process_triggers(use_statsd=False, function_logger=None):
+def _get_batch_size():
+    return getattr(settings, 'DJTRIGGERS_BATCH_SIZE', 500)
+
+
+def _iterate_in_batches(queryset, batch_size):
     """
-    Process all triggers that are ready for processing.
+    Yield the results of a queryset in batches, using keyset pagination on the id so only one batch is in memory at
+    a time, no matter how many rows match.
 
-    :param bool use_statsd: whether to use_statsd
-    :return: None
+    :param queryset: the queryset, this should return the id as first value when it returns tuples
     """
-    process_async = getattr(settings, 'DJTRIGGERS_ASYNC_HANDLING', False)
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0] if isinstance(batch[-1], tuple) else batch[-1].id
 
-    # Get all triggers that need to be processed
-    for model in apps.get_models():
-        # Check whether it's a trigger
-        if not issubclass(model, Trigger) or getattr(model, 'typed', None) is None or isabstract(model):
-            continue
 
+def _get_priorities():
+    """
+    Yield the priorities of the due triggers, highest first. Every priority costs a single query, which only needs
+    the index on the priorities of unprocessed triggers.
+    """
+    priority = None
+    while True:
+        due = Trigger.objects.filter(due_triggers_q())
+        if priority is not None:
+            due = due.filter(priority__lt=priority)
+        priority = due.aggregate(Max('priority'))['priority__max']
+        if priority is None:
+            return
+        yield priority
+
+
+def _get_lanes(paged_by_id=False):
+    """
+    Get the priorities to process the due triggers of, one after the other, with DJTRIGGERS_PRIORITY_LANES. Without
+    it, there's a single lane (None) with all due triggers.
+
+    :param bool paged_by_id: whether the due triggers are fetched in pages of ascending ids (e.g. when they're found
+        with a single query, or claimed), which can't be ordered by priority. Those always go lane by lane.
+    """
+    if paged_by_id or getattr(settings, 'DJTRIGGERS_PRIORITY_LANES', False):
+        return _get_priorities()
+    return [None]
+
+
+def _get_due_triggers_per_type(priority=None):
+    """
+    Yield the triggers that need processing, running a separate query for each trigger type. Types with a higher
+    default priority go first.
+
+    :param int priority: only yield the triggers with this priority, None means all triggers
+    """
+    for model in sorted(registry.get_models(), key=lambda model: -model.default_priority):
         # Get all triggers of this type that need to be processed
-        triggers = model.objects.filter(Q(process_after__isnull=True) | Q(process_after__lt=timezone.now()),
-                                        date_processed__isnull=True)
+        triggers = model.objects.filter(due_triggers_q(), trigger_type=model.typed)
+        if priority is not None:
+            triggers = triggers.filter(priority=priority)
+        for batch in _iterate_in_batches(triggers, _get_batch_size()):
+            for trigger in batch:
+                yield trigger
+
+
+def _fetch_triggers(ids_per_type):
+    """
+    Yield the typed triggers for the given ids, running a query for each trigger type.
+
+    :param dict ids_per_type: maps trigger types to lists of trigger ids
+    """
+    for trigger_type, ids in ids_per_type.items():
+        model = registry.get_model(trigger_type)
+        if model is None:
+            logger.warning('Skipping %s due triggers of unknown type %s', len(ids), trigger_type)
+            continue
+
+        for trigger in model.objects.filter(id__in=ids, date_processed__isnull=True).order_by('id'):
+            yield trigger
+
+
+def _group_by_type(rows):
+    """
+    Group (id, trigger type) rows into a dict that maps trigger types to lists of ids.
+    """
+    ids_per_type = {}
+    for trigger_id, trigger_type in rows:
+        ids_per_type.setdefault(trigger_type, []).append(trigger_id)
+    return ids_per_type
+
+
+def _get_due_triggers_single_query(priority=None):
+    """
+    Yield the triggers that need processing, using a single query on the base trigger table to find the due triggers
+    of all types (per batch). Only the types that actually have due triggers are fetched afterwards.
+
+    :param int priority: only yield the triggers with this priority, None means all triggers
+    """
+    due = Trigger.objects.filter(due_triggers_q())
+    if priority is not None:
+        due = due.filter(priority=priority)
+    for batch in _iterate_in_batches(due.values_list('id', 'trigger_type'), _get_batch_size()):
+        for trigger in _fetch_triggers(_group_by_type(batch)):
+            yield trigger
+
+
+def _get_due_triggers():
+    """
+    Yield the triggers that need processing, lane by lane (see _get_lanes()).
+    """
+    single_query = getattr(settings, 'DJTRIGGERS_SINGLE_QUERY_POLLING', False)
+    for priority in _get_lanes(paged_by_id=single_query):
+        if single_query:
+            triggers = _get_due_triggers_single_query(priority)
+        else:
+            triggers = _get_due_triggers_per_type(priority)
+        for trigger in triggers:
+            yield trigger
+
+
+def _get_claimed_batches(release=True, max_count=None):
+    """
+    Yield batches of triggers that need processing, claiming each batch so other workers skip it.
+
+    :param bool release: whether to release the claim of each batch once it has been handled. Leave the claims when
+        the triggers are handed off to Celery, they then expire after DJTRIGGERS_CLAIM_LEASE_SECONDS.
+    :param int max_count: the maximum number of triggers to claim in total, None means no limit
+    """
+    token = get_claim_token()
+    batch_size = getattr(settings, 'DJTRIGGERS_CLAIM_BATCH_SIZE', 100)
+    for priority in _get_lanes(paged_by_id=True):
+        after_id = 0
+        while max_count is None or max_count > 0:
+            limit = batch_size if max_count is None else min(batch_size, max_count)
+            claimed = claim_triggers(token, limit=limit, after_id=after_id, priority=priority)
+            if not claimed:
+                break
+            after_id = claimed[-1][0]
+            if max_count is not None:
+                max_count -= len(claimed)
+
+            try:
+                yield list(_fetch_triggers(_group_by_type(claimed)))
+            finally:
+                if release:
+                    release_triggers(token, [trigger_id for trigger_id, _ in claimed])
+
+
+def _chunks(iterable, size):
+    """
+    Split an iterable into lists of at most `size` items.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _get_queue_options(priority):
+    """
+    Get the options for the Celery task of a trigger with this priority. DJTRIGGERS_CELERY_PRIORITY_QUEUES maps
+    (minimum) priorities to queues, e.g. {10: 'triggers-urgent', 0: 'triggers'}, and a trigger is sent to the queue of
+    the highest priority it reaches. Without a queue, the default routing of the task applies.
+    """
+    queues = getattr(settings, 'DJTRIGGERS_CELERY_PRIORITY_QUEUES', {})
+    reached = [minimum for minimum in queues if priority >= minimum]
+    if not reached:
+        return {}
+    return {'queue': queues[max(reached)]}
+
+
+def _handle_trigger(trigger, process_async, use_statsd=False, lock=True, save=True):
+    """
+    Process a single trigger, either synchronously or in a Celery task.
+
+    :param bool lock: whether the trigger still needs to be locked before processing it synchronously
+    :param bool save: whether to save the outcome of processing it synchronously
+    """
+    try:
+        if process_async:
+            process_trigger.apply_async((trigger.id, trigger._meta.app_label, trigger.__class__.__name__),
+                                        {'use_statsd': use_statsd},
+                                        max_retries=getattr(settings, 'DJTRIGGERS_CELERY_TASK_MAX_RETRIES', 0),
+                                        **_get_queue_options(trigger.priority))
+        else:
+            # The trigger sends its own stats, once it has been processed
+            trigger.process(use_statsd=use_statsd, lock=lock, save=save)
+    # The trigger didn't need processing yet
+    except ProcessLaterError:
+        pass
+    # The trigger raised an (expected) error while processing
+    except ProcessError:
+        pass
+    # In case a trigger got removed (manually or some process), deal with it
+    except Trigger.DoesNotExist as e:
+        logger.info(e)
+
+
+def _submit_trigger(executor, trigger, use_statsd=False, lock=True):
+    """
+    Submit a trigger for synchronous processing to an executor.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        return executor.submit(process_trigger_in_process, trigger._meta.app_label, trigger.__class__.__name__,
+                               trigger.id, use_statsd, lock)
+    return executor.submit(_handle_trigger, trigger, False, use_statsd, lock=lock)
+
+
+def _get_max_workers(executor):
+    """
+    Get the number of workers of an executor. Standard library pools only have it as a private attribute.
+    """
+    return getattr(executor, 'max_workers', None) or getattr(executor, '_max_workers', None) or 1
+
+
+def _run_triggers(executor, triggers, use_statsd=False, lock=True):
+    """
+    Process triggers synchronously, one by one or concurrently with a pool executor. A pool gets at most two triggers
+    per worker at a time. The first unexpected error is raised once all triggers have been handled.
+    """
+    errors = []
+    if isinstance(executor, SerialExecutor):
+        for trigger in triggers:
+            try:
+                _handle_trigger(trigger, False, use_statsd, lock=lock)
+            except Exception as e:
+                errors.append(e)
+    else:
+        pending = set()
+
+        def collect(done):
+            errors.extend(future.exception() for future in done if future.exception() is not None)
 
-        # Process each trigger
         for trigger in triggers:
+            if len(pending) >= _get_max_workers(executor) * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(_submit_trigger(executor, trigger, use_statsd, lock))
+        collect(wait(pending).done)
+
+    if errors:
+        raise errors[0]
+
+
+def _handle_owned_batch(triggers, use_statsd=False, executor=None):
+    """
+    Process a batch of triggers that are owned (claimed or locked) by this worker. When processed one by one, the
+    outcome of all triggers is saved at once.
+    """
+    if executor is not None and not isinstance(executor, SerialExecutor):
+        _run_triggers(executor, triggers, use_statsd, lock=False)
+        return
+
+    handled = []
+    errors = []
+    try:
+        for trigger in triggers:
+            handled.append(trigger)
             try:
-                # Process the trigger, either synchronously or in a Celery task
+                _handle_trigger(trigger, False, use_statsd, lock=False, save=False)
+            except Exception as e:
+                errors.append(e)
+    finally:
+        Trigger.save_states(handled)
+        flush_loggers()
+
+    # Like _run_triggers(), raise the first unexpected error once all triggers have been handled
+    if errors:
+        raise errors[0]
+
+
+def _handle_locked_batch(rows, use_statsd=False, executor=None):
+    """
+    Lock a batch of triggers in a single round trip, and only process the ones we got the lock for. Those are fetched
+    once they're locked, as another worker may have processed them in the meantime.
+
+    :param list rows: the (id, trigger type) of the triggers
+    """
+    lock_names = {'djtriggers-{}'.format(trigger_id): (trigger_id, trigger_type) for trigger_id, trigger_type in rows}
+    with redis_locks(lock_names, timeout=getattr(settings, 'DJTRIGGERS_BATCH_LOCK_TIMEOUT', None)) as acquired:
+        locked = [row for name, row in lock_names.items() if name in acquired]
+        _handle_owned_batch(list(_fetch_triggers(_group_by_type(locked))), use_statsd, executor)
+
+
+def _dispatch_triggers(triggers, use_statsd=False):
+    """
+    Hand the triggers off to Celery tasks, either one task per trigger or, if DJTRIGGERS_CELERY_BATCH_SIZE is set, one
+    task per batch of triggers of the same type.
+    """
+    batch_size = getattr(settings, 'DJTRIGGERS_CELERY_BATCH_SIZE', None)
+    if not batch_size:
+        for trigger in triggers:
+            _handle_trigger(trigger, True, use_statsd)
+        return
+
+    def dispatch(trigger_type, priority, trigger_ids):
+        process_trigger_batch_task.apply_async((trigger_type, trigger_ids), {'use_statsd': use_statsd},
+                                               max_retries=getattr(settings, 'DJTRIGGERS_CELERY_TASK_MAX_RETRIES', 0),
+                                               **_get_queue_options(priority))
+
+    # Batches are per type and priority, so every batch can go to the queue of its priority
+    ids_per_lane = {}
+    for trigger in triggers:
+        lane = (trigger.trigger_type, trigger.priority)
+        trigger_ids = ids_per_lane.setdefault(lane, [])
+        trigger_ids.append(trigger.id)
+        if len(trigger_ids) >= batch_size:
+            dispatch(*lane, ids_per_lane.pop(lane))
+    for lane, trigger_ids in ids_per_lane.items():
+        dispatch(*lane, trigger_ids)
+
+
+def process_trigger_batch(trigger_type, trigger_ids, use_statsd=False):
+    """
+    Process a batch of triggers of the same type, fetching them with a single query. This is what the
+    process_trigger_batch Celery task runs.
+
+    :param str trigger_type: the type of the triggers
+    :param list trigger_ids: the ids of the triggers
+    :param bool use_statsd: whether to use_statsd
+    :return: None
+    """
+    if registry.get_model(trigger_type) is None:
+        logger.warning('Skipping %s triggers of unknown type %s', len(trigger_ids), trigger_type)
+        return
+
+    try:
+        _handle_locked_batch([(trigger_id, trigger_type) for trigger_id in sorted(trigger_ids)], use_statsd)
+    finally:
+        metrics.flush()
+
+
+def process_triggers(use_statsd=False, function_logger=None, executor=None, max_workers=None, max_count=None,
+                     raise_errors=True):
+    """
+    Process all triggers that are ready for processing.
+
+    :param bool use_statsd: whether to use_statsd
+    :param executor: how to process triggers synchronously: 'serial', 'thread' or 'process', or an executor (which is
+        left running). Defaults to DJTRIGGERS_EXECUTOR, see djtriggers.executors.get_executor().
+    :param int max_workers: the maximum number of triggers processed concurrently by a thread or process pool.
+        Defaults to DJTRIGGERS_EXECUTOR_MAX_WORKERS.
+    :param int max_count: the maximum number of triggers to handle. Defaults to DJTRIGGERS_MAX_PER_TICK.
+    :param bool raise_errors: whether to raise the first unexpected error once all triggers have been handled.
+        Otherwise the errors are logged.
+    :return: the number of due triggers that were handled
+    :rtype: int
+    """
+    process_async = getattr(settings, 'DJTRIGGERS_ASYNC_HANDLING', False)
+    claim = getattr(settings, 'DJTRIGGERS_CLAIM_TRIGGERS', False)
+    if max_count is None:
+        max_count = getattr(settings, 'DJTRIGGERS_MAX_PER_TICK', None)
+    nr_handled = 0
+    errors = []
+
+    def count(triggers):
+        nonlocal nr_handled
+        for trigger in triggers:
+            nr_handled += 1
+            yield trigger
+
+    def handle(function, *args):
+        # Keep going with the next batch when a trigger raises an unexpected error
+        try:
+            function(*args)
+        except Exception as e:
+            errors.append(e)
+
+    if process_async:
+        executor_context = SerialExecutor()
+    elif isinstance(executor, Executor):
+        executor_context = nullcontext(executor)
+    else:
+        executor_context = get_executor(executor, max_workers)
+
+    try:
+        with executor_context as pool:
+            # Claimed triggers are already owned by this worker, so they don't need a lock
+            if claim:
+                for batch in _get_claimed_batches(release=not process_async, max_count=max_count):
+                    nr_handled += len(batch)
+                    if process_async:
+                        handle(_dispatch_triggers, batch, use_statsd)
+                    else:
+                        handle(_handle_owned_batch, batch, use_statsd, pool)
+            else:
+                # Get all triggers that need to be processed
+                triggers = _get_due_triggers()
+                if max_count is not None:
+                    triggers = islice(triggers, max_count)
+                triggers = count(triggers)
+
+                # Celery tasks lock their triggers themselves
                 if process_async:
-                    process_trigger.apply_async((trigger.id, trigger._meta.app_label, trigger.__class__.__name__),
-                                                {'use_statsd': use_statsd},
-                                                max_retries=getattr(settings, 'DJTRIGGERS_CELERY_TASK_MAX_RETRIES', 0))
+                    handle(_dispatch_triggers, triggers, use_statsd)
+                elif getattr(settings, 'DJTRIGGERS_BATCH_LOCKING', False):
+                    for batch in _chunks(triggers, getattr(settings, 'DJTRIGGERS_LOCK_BATCH_SIZE', 500)):
+                        handle(_handle_locked_batch, [(trigger.id, trigger.trigger_type) for trigger in batch],
+                               use_statsd, pool)
                 else:
-                    trigger.process()
-
-                # Send stats to statsd if necessary
-                if use_statsd:
-                    from django_statsd.clients import statsd
-                    statsd.incr('triggers.{}.processed'.format(trigger.trigger_type))
-                    if trigger.date_processed and trigger.process_after:
-                        statsd.timing('triggers.{}.process_delay_seconds'.format(trigger.trigger_type),
-                                      (trigger.date_processed - trigger.process_after).total_seconds())
-            # The trigger didn't need processing yet
-            except ProcessLaterError:
-                pass
-            # The trigger raised an (expected) error while processing
-            except ProcessError:
-                pass
-            # In case a trigger got removed (manually or some process), deal with it
-            except Trigger.DoesNotExist as e:
-                logger.info(e)
-
-
-def clean_triggers(expiration_dt=None, type_to_table=None):
+                    handle(_run_triggers, pool, triggers, use_statsd)
+    finally:
+        # Write out the results that loggers buffered, and send the stats of the batch
+        flush_loggers()
+        metrics.flush()
+
+    if errors:
+        if raise_errors:
+            raise errors[0]
+        for error in errors:
+            logger.error('Processing triggers failed', exc_info=error)
+    return nr_handled
+
+
+async def _aiterate_in_batches(queryset, batch_size):
+    """
+    Yield the results of a queryset in batches, with the async ORM. This is the asyncio version of
+    _iterate_in_batches().
+    """
+    last_id = 0
+    while True:
+        batch = [row async for row in queryset.filter(id__gt=last_id).order_by('id')[:batch_size]]
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1][0] if isinstance(batch[-1], tuple) else batch[-1].id
+
+
+async def _ahandle_trigger(trigger, semaphore, use_statsd=False):
+    """
+    Process a single trigger from asyncio code, with at most as many triggers at a time as the semaphore allows.
+    """
+    async with semaphore:
+        try:
+            await trigger.aprocess(use_statsd=use_statsd)
+        # The trigger didn't need processing yet
+        except ProcessLaterError:
+            pass
+        # The trigger raised an (expected) error while processing
+        except ProcessError:
+            pass
+        # In case a trigger got removed (manually or some process), deal with it
+        except Trigger.DoesNotExist as e:
+            logger.info(e)
+
+
+async def aprocess_triggers(use_statsd=False, concurrency=None):
+    """
+    Process all triggers that are ready for processing, concurrently on the running event loop. Triggers with an
+    `async def _process()` are awaited, others are run in a thread (see Trigger.aprocess()).
+
+    :param bool use_statsd: whether to use_statsd
+    :param int concurrency: the maximum number of triggers processed at the same time.
+        Defaults to DJTRIGGERS_ASYNC_CONCURRENCY, or 10.
+    :return: None
+    """
+    if concurrency is None:
+        concurrency = getattr(settings, 'DJTRIGGERS_ASYNC_CONCURRENCY', 10)
+
+    semaphore = Semaphore(concurrency)
+    errors = []
+    due = Trigger.objects.filter(due_triggers_q()).values_list('id', 'trigger_type')
+    async for batch in _aiterate_in_batches(due, _get_batch_size()):
+        triggers = []
+        for trigger_type, ids in _group_by_type(batch).items():
+            model = registry.get_model(trigger_type)
+            if model is None:
+                logger.warning('Skipping %s due triggers of unknown type %s', len(ids), trigger_type)
+                continue
+            triggers += [trigger async for trigger in model.objects.filter(id__in=ids, date_processed__isnull=True)]
+
+        results = await gather(*(_ahandle_trigger(trigger, semaphore, use_statsd) for trigger in triggers),
+                               return_exceptions=True)
+        errors.extend(result for result in results if isinstance(result, Exception))
+
+    await sync_to_async(flush_loggers)()
+    metrics.flush()
+    if errors:
+        raise errors[0]
+
+
+def _get_tables(trigger_type, type_to_table):
+    """
+    Get the tables with information of a trigger type, as (table, id column) tuples in the order they can be cleaned
+    up: the tables from `type_to_table` first, followed by the tables of the trigger model and the tables that refer to
+    it (child tables first, see TriggerRegistry.get_tables()).
+    """
+    table = type_to_table.get(trigger_type, ())
+    if not isinstance(table, tuple):
+        table = (table,)
+
+    tables = [t if isinstance(t, tuple) else (t, 'trigger_ptr_id') for t in table]
+    # The ORM deletes the tables of the trigger model
+    if registry.needs_orm_delete(trigger_type):
+        return tables
+    return tables + [t for t in registry.get_tables(trigger_type) if t not in tables]
+
+
+def clean_triggers(expiration_dt=None, type_to_table=None, chunk_size=None, chunk_sleep=None):
     """
     Clean old processed triggers from the database.
 
@@ -74,6 +543,18 @@ def clean_triggers(expiration_dt=None, type_to_table=None):
             Defaults to 2 months before the current time.
         type_to_table (optional dict): maps trigger type to database table name.
             Defaults to DJTRIGGERS_TYPE_TO_TABLE django setting.
+        chunk_size (optional int): the number of triggers deleted at once.
+            Defaults to DJTRIGGERS_CLEAN_CHUNK_SIZE django setting, or 1000.
+        chunk_sleep (optional float): how many seconds to wait between chunks, e.g. to limit replication lag.
+            Defaults to DJTRIGGERS_CLEAN_CHUNK_SLEEP django setting, or 0.
+
+    Triggers are deleted in chunks of consecutive ids. Every chunk is deleted with a
+    DELETE query per table in a single transaction, without loading the triggers.
+
+    The tables of trigger models that use multi-table inheritance, and the tables of models with a foreign key to a
+    trigger model, are found automatically. When some of those relations can't simply be deleted (e.g. they're
+    SET_NULL, or other tables refer to them in turn), the triggers of that type are deleted with the ORM instead.
+    `type_to_table` only needs to contain other tables with trigger information.
 
     `type_to_table` contains has information about which trigger has information
     in which table. This setting is a dict with the trigger types as keys and two
@@ -99,24 +580,41 @@ def clean_triggers(expiration_dt=None, type_to_table=None):
     if type_to_table is None:
         type_to_table = getattr(settings, 'DJTRIGGERS_TYPE_TO_TABLE', {})
 
-    cursor = connections['default'].cursor()
-    sentinel = object()
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'DJTRIGGERS_CLEAN_CHUNK_SIZE', 1000)
+
+    if chunk_sleep is None:
+        chunk_sleep = getattr(settings, 'DJTRIGGERS_CLEAN_CHUNK_SLEEP', 0)
+
+    connection = connections['default']
+    trigger_table = Trigger._meta.db_table
+    # The triggers of a chunk, as SQL condition on the trigger table
+    chunk_condition = 'id >= %s AND id <= %s AND date_processed < %s'
     nr_deleted = 0
 
-    for trigger in Trigger.objects.filter(date_processed__lt=expiration_dt):
-        # Delete custom trigger information
-        table = type_to_table.get(trigger.trigger_type, sentinel)
-        if isinstance(table, tuple):
-            for t in table:
-                if isinstance(t, tuple):
-                    cursor.execute('DELETE FROM {} WHERE {} = {}'.format(t[0], t[1], trigger.id))
-                else:
-                    cursor.execute('DELETE FROM {} WHERE trigger_ptr_id = {}'.format(t, trigger.id))
-        elif table != sentinel:
-            cursor.execute('DELETE FROM {} WHERE trigger_ptr_id = {}'.format(table, trigger.id))
+    expired = Trigger.objects.filter(date_processed__lt=expiration_dt).values_list('id', 'trigger_type')
+    for chunk in _iterate_in_batches(expired, chunk_size):
+        if nr_deleted and chunk_sleep:
+            sleep(chunk_sleep)
+
+        params = [chunk[0][0], chunk[-1][0], connection.ops.adapt_datetimefield_value(expiration_dt)]
+        with transaction.atomic(using='default'), connection.cursor() as cursor:
+            for trigger_type, ids in sorted(_group_by_type(chunk).items()):
+                # Delete custom trigger information
+                for table, column in _get_tables(trigger_type, type_to_table):
+                    cursor.execute('DELETE FROM {} WHERE {} IN (SELECT id FROM {} WHERE {} AND trigger_type = %s)'
+                                   .format(table, column, trigger_table, chunk_condition), params + [trigger_type])
+
+                # Let the ORM follow relations that can't simply be deleted
+                if registry.needs_orm_delete(trigger_type):
+                    model = registry.get_model(trigger_type) or Trigger
+                    deleted = model.objects.filter(id__in=ids, date_processed__lt=expiration_dt).delete()[1]
+                    # The rows of the main trigger table, which are counted per (proxy) model
+                    nr_deleted += sum(count for label, count in deleted.items()
+                                      if apps.get_model(label)._meta.concrete_model is Trigger)
 
-        # Delete the trigger from the main table
-        trigger.delete()
-        nr_deleted += 1
+            # Delete the triggers from the main table
+            cursor.execute('DELETE FROM {} WHERE {}'.format(trigger_table, chunk_condition), params)
+            nr_deleted += cursor.rowcount
 
     return nr_deleted
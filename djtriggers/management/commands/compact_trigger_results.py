@@ -0,0 +1,23 @@
+from logging import getLogger
+
+from django.core.management.base import BaseCommand
+
+from djtriggers.results import ENCODINGS, compact_trigger_results
+
+
+logger = getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = compact_trigger_results.__doc__.strip()
+
+    def add_arguments(self, parser):
+        parser.add_argument('--encoding', dest='encoding', choices=[e for e in ENCODINGS if e], default=None,
+                            help='How to store the results. Defaults to the DJTRIGGERS_RESULT_ENCODING setting.')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=None,
+                            help='The number of results converted at once. '
+                                 'Defaults to the DJTRIGGERS_RESULT_BATCH_SIZE setting.')
+
+    def handle(self, **options):
+        nr_converted = compact_trigger_results(encoding=options['encoding'], batch_size=options['batch_size'])
+        logger.info('Converted %s trigger results', nr_converted)
@@ -1,19 +1,26 @@
-from django.core.management.base import NoArgsCommand
-
-from optparse import make_option
+from django.core.management.base import BaseCommand
 
 from djtriggers import logic
+from djtriggers.executors import EXECUTORS
+
 
+class Command(BaseCommand):
+    help = 'Process all triggers that are ready for processing.'
 
-class Command(NoArgsCommand):
-    option_list = NoArgsCommand.option_list + (
-        make_option('--use-statsd', dest='use_statsd', action='store_true', default=False,
-                    help='Send stats about processing to Statsd'),
-    )
+    def add_arguments(self, parser):
+        parser.add_argument('--use-statsd', dest='use_statsd', action='store_true', default=False,
+                            help='Send stats about processing to Statsd')
+        parser.add_argument('--executor', dest='executor', choices=EXECUTORS, default=None,
+                            help='Process triggers one by one, or concurrently in a thread or process pool. '
+                                 'Defaults to the DJTRIGGERS_EXECUTOR setting.')
+        parser.add_argument('--max-workers', dest='max_workers', type=int, default=None,
+                            help='The maximum number of triggers processed concurrently by a pool. '
+                                 'Defaults to the DJTRIGGERS_EXECUTOR_MAX_WORKERS setting.')
 
-    def handle_noargs(self, **options):
+    def handle(self, **options):
         """
         Process all triggers in order of trigger type. This blocks while
         processing the triggers.
         """
-        logic.process_triggers(use_statsd=options['use_statsd'])
+        logic.process_triggers(use_statsd=options['use_statsd'], executor=options['executor'],
+                               max_workers=options['max_workers'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from djtriggers.executors import EXECUTORS
+from djtriggers.worker import TriggerWorker
+
+
+class Command(BaseCommand):
+    help = 'Process triggers as they become due, until stopped with SIGTERM or SIGINT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--use-statsd', dest='use_statsd', action='store_true', default=False,
+                            help='Send stats about processing to Statsd')
+        parser.add_argument('--executor', dest='executor', choices=EXECUTORS, default=None,
+                            help='Process triggers one by one, or concurrently in a thread or process pool. '
+                                 'Defaults to the DJTRIGGERS_EXECUTOR setting.')
+        parser.add_argument('--max-workers', dest='max_workers', type=int, default=None,
+                            help='The maximum number of triggers processed concurrently by a pool. '
+                                 'Defaults to the DJTRIGGERS_EXECUTOR_MAX_WORKERS setting.')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=None,
+                            help='The maximum number of triggers handled at once. '
+                                 'Defaults to the DJTRIGGERS_WORKER_BATCH_SIZE setting.')
+        parser.add_argument('--min-sleep', dest='min_sleep', type=float, default=None,
+                            help='How many seconds to sleep after handling some triggers. '
+                                 'Defaults to the DJTRIGGERS_WORKER_MIN_SLEEP setting.')
+        parser.add_argument('--max-sleep', dest='max_sleep', type=float, default=None,
+                            help='The maximum number of seconds to sleep when idle. '
+                                 'Defaults to the DJTRIGGERS_WORKER_MAX_SLEEP setting.')
+
+    def handle(self, **options):
+        """
+        Process triggers until stopped. The current batch is finished before stopping.
+        """
+        TriggerWorker(use_statsd=options['use_statsd'], executor=options['executor'],
+                      max_workers=options['max_workers'], batch_size=options['batch_size'],
+                      min_sleep=options['min_sleep'], max_sleep=options['max_sleep']).run()
@@ -1,8 +1,23 @@
-from django.db import models
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.constants import OnConflict
+from django.db.models import Q
+from django.utils import timezone
+
+
+def due_triggers_q(now=None):
+    """
+    Get the filter for triggers that are ready for processing at `now` (defaults to the current time).
+    """
+    if now is None:
+        now = timezone.now()
+    return Q(Q(process_after__isnull=True) | Q(process_after__lt=now), date_processed__isnull=True)
 
 
 class TriggerManager(models.Manager):
-    def __init__(self, trigger_type):
+    def __init__(self, trigger_type=None):
         super(TriggerManager, self).__init__()
         self.trigger_type = trigger_type
 
@@ -15,3 +30,202 @@ class TriggerManager(models.Manager):
     def get_unprocessed_triggers(self):
         qs = self.get_queryset()
         return qs.filter(date_processed__isnull=True)
+
+    def bulk_enqueue(self, sources, process_after=None, skip_duplicates=False, batch_size=None, **fields):
+        """
+        Create a trigger for each source, with a bulk INSERT per batch. This works for proxy models and for models
+        with multi-table inheritance (with an INSERT per table), as long as the database can return the ids of bulk
+        inserted rows. Otherwise the triggers are saved one by one.
+
+        :param sources: the sources of the triggers, as strings or as tuples (like Trigger.set_source())
+        :param datetime process_after: when to process the triggers
+        :param bool skip_duplicates: whether to skip the sources that already have an unprocessed trigger of this type
+            (or that are given more than once), checked with a single query per batch. With `unique_source` set, these
+            are always skipped, as the database ensures there's only one.
+        :param int batch_size: the number of triggers created at once. Defaults to DJTRIGGERS_ENQUEUE_BATCH_SIZE, or
+            1000.
+        :param fields: values for other fields of the triggers
+        :return: the created triggers
+        :rtype: list
+        """
+        if self.model.typed is None:
+            raise TypeError('Can only enqueue triggers of a model with a trigger type')
+        if batch_size is None:
+            batch_size = getattr(settings, 'DJTRIGGERS_ENQUEUE_BATCH_SIZE', 1000)
+
+        created = []
+        seen = set()
+        batch = []
+        for source in sources:
+            batch.append('$'.join(str(arg) for arg in source) if isinstance(source, tuple) else source)
+            if len(batch) >= batch_size:
+                created += self._enqueue_batch(batch, seen if skip_duplicates else None, process_after, fields)
+                batch = []
+        if batch:
+            created += self._enqueue_batch(batch, seen if skip_duplicates else None, process_after, fields)
+
+        if created:
+            from .notifications import notify_triggers
+            notify_triggers(self.db)
+        return created
+
+    def _enqueue_batch(self, sources, seen, process_after, fields):
+        """
+        Create the triggers for a batch of sources.
+
+        :param set seen: the sources that were enqueued before, or None to allow duplicates
+        """
+        if seen is not None:
+            pending = set(self.model._base_manager.using(self.db).filter(
+                trigger_type=self.model.typed, date_processed__isnull=True, source__in=set(sources) - seen,
+            ).values_list('source', flat=True))
+            unique_sources = []
+            for source in sources:
+                if source not in seen and source not in pending:
+                    unique_sources.append(source)
+                seen.add(source)
+            sources = unique_sources
+
+        triggers = [self.model(source=source, process_after=process_after, **fields) for source in sources]
+        if not triggers:
+            return triggers
+        if self.model.unique_source:
+            return self._enqueue_unique(triggers)
+
+        concrete_model = self.model._meta.concrete_model
+        if not concrete_model._meta.parents:
+            return self.bulk_create(triggers)
+
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db, savepoint=False):
+            if not connection.features.can_return_rows_from_bulk_insert:
+                for trigger in triggers:
+                    trigger.save(using=self.db)
+                return triggers
+
+            # bulk_create() doesn't support multi-table inheritance, so insert the rows of every table separately:
+            # first the trigger table, which returns the ids, followed by the tables of the subclasses
+            models = self._get_concrete_models()
+            models[0]._base_manager.using(self.db).bulk_create(triggers)
+            self._insert_subclass_rows(triggers, models[1:])
+        return triggers
+
+    def _enqueue_unique(self, triggers):
+        """
+        Create the triggers of a model with `unique_source` set, skipping the ones whose source already has an
+        unprocessed trigger of this type. The djtriggers_unique_pending constraint decides, so this holds even for
+        concurrent calls.
+
+        Where the database supports it, this is an INSERT ... ON CONFLICT DO NOTHING per batch (plus an INSERT per
+        table of a model with multi-table inheritance). Otherwise every trigger is saved in a savepoint, which is
+        rolled back when it already exists.
+
+        :return: the created triggers
+        :rtype: list
+        """
+        connection = connections[self.db]
+        if not (connection.features.supports_ignore_conflicts and connection.features.can_return_rows_from_bulk_insert):
+            created = []
+            for trigger in triggers:
+                try:
+                    with transaction.atomic(using=self.db):
+                        trigger.save(using=self.db)
+                except IntegrityError:
+                    continue
+                created.append(trigger)
+            return created
+
+        models = self._get_concrete_models()
+        base = models[0]
+        fields = [field for field in base._meta.local_concrete_fields if field is not base._meta.auto_field]
+        returning_fields = [base._meta.pk, base._meta.get_field('source')]
+        size = connection.ops.bulk_batch_size(fields, triggers) or len(triggers)
+        created = []
+        with transaction.atomic(using=self.db, savepoint=False):
+            for start in range(0, len(triggers), size):
+                batch = triggers[start:start + size]
+                rows = base._base_manager.using(self.db)._insert(batch, fields=fields,
+                                                                 returning_fields=returning_fields,
+                                                                 on_conflict=OnConflict.IGNORE)
+                # Only the inserted rows are returned, in no particular order
+                ids = {source: trigger_id for trigger_id, source in filter(None, rows)}
+                for trigger in batch:
+                    if trigger.source in ids:
+                        trigger.id = ids.pop(trigger.source)
+                        trigger._state.adding = False
+                        trigger._state.db = self.db
+                        created.append(trigger)
+            if created:
+                self._insert_subclass_rows(created, models[1:])
+        return created
+
+    def enqueue_once(self, source, process_after=None, **fields):
+        """
+        Create a trigger, unless its source already has an unprocessed trigger of this type. This needs a model with
+        `unique_source` set, so the database guarantees the uniqueness even for concurrent calls.
+
+        Where the database supports it, this is a single INSERT ... ON CONFLICT DO NOTHING (plus an INSERT per table
+        of a model with multi-table inheritance). Otherwise the trigger is saved in a savepoint, which is rolled back
+        when it already exists.
+
+        :param source: the source of the trigger, as a string or as a tuple (like Trigger.set_source())
+        :param datetime process_after: when to process the trigger
+        :param fields: values for other fields of the trigger
+        :return: the created trigger, or None if there already was one
+        """
+        if not self.model.unique_source:
+            raise TypeError('Can only enqueue triggers once for a model with unique_source set')
+
+        if isinstance(source, tuple):
+            source = '$'.join(str(arg) for arg in source)
+        trigger = self.model(source=source, process_after=process_after, **fields)
+
+        features = connections[self.db].features
+        if not (features.supports_ignore_conflicts and features.can_return_columns_from_insert):
+            try:
+                with transaction.atomic(using=self.db):
+                    trigger.save(using=self.db)
+            except IntegrityError:
+                return None
+            return trigger
+
+        models = self._get_concrete_models()
+        base = models[0]
+        fields = [field for field in base._meta.local_concrete_fields if field is not base._meta.auto_field]
+        with transaction.atomic(using=self.db, savepoint=False) if len(models) > 1 else nullcontext():
+            rows = base._base_manager.using(self.db)._insert([trigger], fields=fields,
+                                                             returning_fields=base._meta.db_returning_fields,
+                                                             on_conflict=OnConflict.IGNORE)
+            # Nothing is returned when the row already exists
+            if not rows or rows[0] is None:
+                return None
+            trigger.id = rows[0][0]
+            self._insert_subclass_rows([trigger], models[1:])
+
+        trigger._state.adding = False
+        trigger._state.db = self.db
+        from .notifications import notify_triggers
+        notify_triggers(self.db)
+        return trigger
+
+    def _get_concrete_models(self):
+        """
+        Get the models with a table for this model, starting with Trigger.
+        """
+        concrete_model = self.model._meta.concrete_model
+        return list(reversed(concrete_model._meta.get_parent_list())) + [concrete_model]
+
+    def _insert_subclass_rows(self, triggers, models):
+        """
+        Insert the rows of triggers with multi-table inheritance in the tables of `models`, after the row in the
+        trigger table has been inserted.
+        """
+        connection = connections[self.db]
+        for model in models:
+            for parent_link in model._meta.parents.values():
+                for trigger in triggers:
+                    setattr(trigger, parent_link.attname, trigger.id)
+            fields = model._meta.local_concrete_fields
+            size = connection.ops.bulk_batch_size(fields, triggers) or len(triggers)
+            for start in range(0, len(triggers), size):
+                model._base_manager.using(self.db)._insert(triggers[start:start + size], fields=fields)
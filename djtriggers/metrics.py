@@ -0,0 +1,139 @@
+from logging import getLogger
+from multiprocessing.util import Finalize
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+logger = getLogger(__name__)
+
+
+class NullBackend(object):
+    """
+    Drops all metrics.
+    """
+    def send(self, counters, timers):
+        """
+        Send aggregated metrics.
+
+        :param dict counters: the total per (trigger type, name)
+        :param dict timers: the list of measured values per (trigger type, name)
+        """
+        pass
+
+
+class StatsdBackend(NullBackend):
+    """
+    Sends the metrics with django_statsd as triggers.<trigger type>.<name>, packing them in as few packets as possible.
+    """
+    def send(self, counters, timers):
+        from django_statsd.clients import statsd
+        with statsd.pipeline() as pipeline:
+            for (trigger_type, name), count in counters.items():
+                pipeline.incr('triggers.{}.{}'.format(trigger_type, name), count)
+            for (trigger_type, name), values in timers.items():
+                for value in values:
+                    pipeline.timing('triggers.{}.{}'.format(trigger_type, name), value)
+
+
+# Metrics can only be registered once with prometheus_client
+_prometheus_metrics = {}
+
+
+class PrometheusBackend(NullBackend):
+    """
+    Updates prometheus_client metrics: a counter djtriggers_<name>_total per counter, and a histogram djtriggers_<name>
+    per timer, labelled with the trigger type. Exposing them is up to the application.
+    """
+    def __init__(self):
+        if prometheus_client is None:
+            raise ImproperlyConfigured('The prometheus trigger metrics backend needs the prometheus_client package')
+
+    def send(self, counters, timers):
+        for (trigger_type, name), count in counters.items():
+            self._get_metric(prometheus_client.Counter, name) \
+                .labels(trigger_type=trigger_type).inc(count)
+        for (trigger_type, name), values in timers.items():
+            histogram = self._get_metric(prometheus_client.Histogram, name) \
+                .labels(trigger_type=trigger_type)
+            for value in values:
+                histogram.observe(value)
+
+    def _get_metric(self, metric_class, name):
+        if name not in _prometheus_metrics:
+            _prometheus_metrics[name] = metric_class('djtriggers_{}'.format(name), 'django-triggers {}'.format(name),
+                                                     ['trigger_type'])
+        return _prometheus_metrics[name]
+
+
+METRICS_BACKENDS = {
+    'statsd': StatsdBackend,
+    'prometheus': PrometheusBackend,
+    'null': NullBackend,
+}
+
+
+def get_metrics_backend():
+    """
+    Get the backend that DJTRIGGERS_METRICS_BACKEND names: 'statsd' (the default), 'prometheus' or 'null'.
+    """
+    name = getattr(settings, 'DJTRIGGERS_METRICS_BACKEND', 'statsd')
+    if name not in METRICS_BACKENDS:
+        raise ImproperlyConfigured('Unknown trigger metrics backend {}, use one of {}'.format(
+            name, ', '.join(METRICS_BACKENDS)))
+    return METRICS_BACKENDS[name]()
+
+
+class Metrics(object):
+    """
+    Aggregates the metrics of processing triggers in memory, so they're sent once per batch of triggers (see flush())
+    instead of once per trigger. Metrics are also sent when they're older than DJTRIGGERS_METRICS_FLUSH_INTERVAL (10)
+    seconds, and when the process exits.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = {}
+        self.timers = {}
+        self.last_flush = monotonic()
+        # Unlike atexit, this also runs when a worker process of a process pool exits
+        Finalize(None, self.flush, exitpriority=0)
+
+    def incr(self, trigger_type, name, count=1):
+        key = (trigger_type, name)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + count
+        self._flush_if_due()
+
+    def timing(self, trigger_type, name, value):
+        with self.lock:
+            self.timers.setdefault((trigger_type, name), []).append(value)
+        self._flush_if_due()
+
+    def flush(self):
+        """
+        Send the metrics that were aggregated so far.
+        """
+        with self.lock:
+            counters, timers = self.counters, self.timers
+            self.counters, self.timers = {}, {}
+            self.last_flush = monotonic()
+
+        if counters or timers:
+            try:
+                get_metrics_backend().send(counters, timers)
+            except Exception:
+                logger.exception('Sending trigger metrics failed')
+
+    def _flush_if_due(self):
+        if monotonic() - self.last_flush >= getattr(settings, 'DJTRIGGERS_METRICS_FLUSH_INTERVAL', 10):
+            self.flush()
+
+
+metrics = Metrics()
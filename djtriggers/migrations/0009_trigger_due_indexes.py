@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djtriggers', '0008_trigger_claim'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trigger',
+            index=models.Index(condition=models.Q(('date_processed__isnull', True)), fields=['trigger_type', 'process_after'], name='djtriggers_due_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trigger',
+            index=models.Index(condition=models.Q(('date_processed__isnull', True)), fields=['id'], name='djtriggers_pending_idx'),
+        ),
+    ]
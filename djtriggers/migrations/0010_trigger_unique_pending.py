@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djtriggers', '0009_trigger_due_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trigger',
+            name='unique_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='trigger',
+            constraint=models.UniqueConstraint(condition=models.Q(('date_processed__isnull', True), ('unique_pending', True)), fields=('trigger_type', 'source'), name='djtriggers_unique_pending'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djtriggers', '0010_trigger_unique_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trigger',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='trigger',
+            index=models.Index(condition=models.Q(('date_processed__isnull', True)), fields=['priority', 'id'], name='djtriggers_pending_prio_idx'),
+        ),
+    ]
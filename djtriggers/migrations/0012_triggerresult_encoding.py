@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djtriggers', '0011_trigger_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='triggerresult',
+            name='encoding',
+            field=models.CharField(blank=True, default='', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='triggerresult',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='triggerresult',
+            name='result',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -1,16 +1,26 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from contextlib import nullcontext
+from inspect import iscoroutinefunction
 from logging import ERROR, WARNING
 from redis.exceptions import LockError
+from time import perf_counter
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.db.models.base import ModelBase
 from django.utils import timezone
 
 from .managers import TriggerManager
 from .exceptions import ProcessLaterError
-from .locking import redis_lock
+from .locking import aredis_lock, redis_lock
 from .loggers import get_logger
 from .loggers.base import TriggerLogger
+from .metrics import metrics
+from .results import decode_result, encode_result
+from .retry import get_retry_policy
+from .signals import measure, trigger_processed
+from .throttling import athrottle, throttle
 
 
 class TriggerBase(ModelBase):
@@ -59,6 +69,19 @@ class Trigger(models.Model):
 
     # Set typed in a subclass to make it a typed trigger.
     typed = None
+    # Set unique_source in a subclass to allow only one unprocessed trigger of the type per source, see
+    # TriggerManager.enqueue_once().
+    unique_source = False
+    # Set default_priority in a subclass to process its triggers before (when higher) or after (when lower) the
+    # triggers of other types. New triggers get it as priority, unless another one is given.
+    default_priority = 0
+    # Set max_concurrency and/or rate_limit (per second) in a subclass to limit how many of its triggers are processed
+    # at the same time, and how often, by all workers together. Throttled triggers are processed later, see
+    # djtriggers.throttling.
+    max_concurrency = None
+    rate_limit = None
+    # Set retry_policy in a subclass to decide when its failed triggers are retried, see djtriggers.retry.
+    retry_policy = None
 
     trigger_type = models.CharField(max_length=50, db_index=True)
     source = models.CharField(max_length=150, null=True, blank=True, db_index=True)
@@ -67,13 +90,46 @@ class Trigger(models.Model):
     process_after = models.DateTimeField(null=True, blank=True, db_index=True)
     number_of_tries = models.IntegerField(default=0)
     successful = models.BooleanField(default=None, null=True)
+    # Set when a worker claims the trigger for processing, see djtriggers.claiming
+    claimed_by = models.CharField(max_length=100, null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    # Whether the source of the trigger is unique among the unprocessed triggers of its type, see unique_source
+    unique_pending = models.BooleanField(default=False, editable=False)
+    priority = models.IntegerField(default=0)
 
     _logger_class = None
 
+    objects = TriggerManager()
+
+    class Meta:
+        indexes = [
+            # For the due triggers of a type
+            models.Index(fields=['trigger_type', 'process_after'], condition=Q(date_processed__isnull=True),
+                         name='djtriggers_due_type_idx'),
+            # For the due triggers of all types, in order of id
+            models.Index(fields=['id'], condition=Q(date_processed__isnull=True), name='djtriggers_pending_idx'),
+            # For the priorities of the due triggers, and the due triggers of a priority in order of id
+            models.Index(fields=['priority', 'id'], condition=Q(date_processed__isnull=True),
+                         name='djtriggers_pending_prio_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['trigger_type', 'source'],
+                                    condition=Q(date_processed__isnull=True, unique_pending=True),
+                                    name='djtriggers_unique_pending'),
+        ]
+
+    # The fields that processing a trigger changes. Only these are written when saving the outcome of processing, so
+    # subclasses that change their own fields in _process() have to save those themselves.
+    state_fields = ('date_processed', 'successful', 'number_of_tries', 'process_after')
+
     def __init__(self, *args, **kwargs):
         super(Trigger, self).__init__(*args, **kwargs)
-        if hasattr(self, 'typed'):
+        if self.typed is not None:
             self.trigger_type = self.typed
+        if self.pk is None:
+            self.unique_pending = self.unique_source
+            if 'priority' not in kwargs:
+                self.priority = self.default_priority
 
         if self._logger_class:
             self.logger = get_logger(self._logger_class)
@@ -87,13 +143,17 @@ class Trigger(models.Model):
     def get_source(self):
         return tuple(x for x in self.source.split('$') if x != '')
 
-    def process(self, force=False, logger=None, dictionary=None, use_statsd=False):
+    def process(self, force=False, logger=None, dictionary=None, use_statsd=False, lock=True, save=True):
         """
-        Executes the Trigger
+        Executes the Trigger. An `async def _process()` is run with async_to_sync(), so this can't be called from a
+        running event loop, use aprocess() there.
         :param bool force: force the execution
         :param string logger: slug of preferred logger
         :param dict dictionary: dictionary needed by trigger to execute
         :param bool use_statsd: whether to use statsd
+        :param bool lock: whether to lock the trigger, disable when the caller already owns it (e.g. claimed it)
+        :param bool save: whether to save the outcome, disable when the caller saves it together with other triggers
+            (see save_states()) while it still owns the trigger
         :return: None
         """
         dictionary = {} if dictionary is None else {}
@@ -101,41 +161,156 @@ class Trigger(models.Model):
         # The task gets locked because multiple tasks in the queue can process the same trigger.
         # The lock assures no two tasks can process a trigger simultaneously.
         # The check for date_processed assures a trigger is not executed multiple times.
+        timings = {'lock_wait': None, 'process_time': None, 'persist_time': None}
+        started = perf_counter()
+        try:
+            with redis_lock('djtriggers-' + str(self.id), blocking_timeout=0) if lock else nullcontext():
+                if lock:
+                    timings['lock_wait'] = perf_counter() - started
+                if not self._prepare_processing(force, logger):
+                    return
+
+                try:
+                    # execute trigger
+                    with throttle(self), measure(timings, 'process_time'):
+                        # Run an async def _process() on an event loop of its own
+                        if iscoroutinefunction(self._process):
+                            result = async_to_sync(self._process)(dictionary)
+                        else:
+                            result = self._process(dictionary)
+                    self.logger.log_result(self, result)
+                    with measure(timings, 'persist_time') if save else nullcontext():
+                        self._handle_execution_success(use_statsd, save=save)
+                except ProcessLaterError as e:
+                    self.process_after = e.process_after
+                    if save:
+                        self.save_state()
+                except Exception as e:
+                    with measure(timings, 'persist_time') if save else nullcontext():
+                        self._handle_execution_failure(e, use_statsd, save=save)
+                    self._report_timings(timings, use_statsd, e)
+                    raise
+                else:
+                    self._report_timings(timings, use_statsd)
+        except LockError:
+            pass
+
+    async def aprocess(self, force=False, logger=None, dictionary=None, use_statsd=False, lock=True):
+        """
+        Executes the Trigger from asyncio code. This is the asyncio version of process(), which awaits _process() if
+        it's a coroutine function (and runs it in a thread otherwise), and saves the outcome with the async ORM.
+        :param bool force: force the execution
+        :param string logger: slug of preferred logger
+        :param dict dictionary: dictionary needed by trigger to execute
+        :param bool use_statsd: whether to use statsd
+        :param bool lock: whether to lock the trigger, disable when the caller already owns it (e.g. claimed it)
+        :return: None
+        """
+        dictionary = {} if dictionary is None else {}
+
+        timings = {'lock_wait': None, 'process_time': None, 'persist_time': None}
+        started = perf_counter()
         try:
-            with redis_lock('djtriggers-' + str(self.id), blocking_timeout=0):
-                if logger:
-                    self.logger = get_logger(logger)
-                now = timezone.now()
-                if not force and self.date_processed is not None:
-                    # trigger has already been processed. So everything is fine
+            async with aredis_lock('djtriggers-' + str(self.id), blocking_timeout=0) if lock else nullcontext():
+                if lock:
+                    timings['lock_wait'] = perf_counter() - started
+                if not self._prepare_processing(force, logger):
                     return
-                if not force and self.process_after and self.process_after >= now:
-                    raise ProcessLaterError(self.process_after)
 
                 try:
                     # execute trigger
-                    self.logger.log_result(self, self._process(dictionary))
-                    self._handle_execution_success(use_statsd)
+                    async with athrottle(self):
+                        with measure(timings, 'process_time'):
+                            if iscoroutinefunction(self._process):
+                                result = await self._process(dictionary)
+                            else:
+                                result = await sync_to_async(self._process)(dictionary)
+                    await sync_to_async(self.logger.log_result)(self, result)
+                    self._handle_execution_success(use_statsd, save=False)
                 except ProcessLaterError as e:
                     self.process_after = e.process_after
-                    self.save()
+                    await self.asave_state()
+                    return
                 except Exception as e:
-                    self._handle_execution_failure(e, use_statsd)
+                    self._handle_execution_failure(e, use_statsd, save=False)
+                    with measure(timings, 'persist_time'):
+                        await self.asave_state()
+                    self._report_timings(timings, use_statsd, e)
                     raise
+                with measure(timings, 'persist_time'):
+                    await self.asave_state()
+                self._report_timings(timings, use_statsd)
         except LockError:
             pass
 
+    def _prepare_processing(self, force=False, logger=None):
+        """
+        Check whether the trigger can be processed now.
+        :param bool force: force the execution
+        :param string logger: slug of preferred logger
+        :return: whether the trigger needs processing, False if it has already been processed
+        :raises ProcessLaterError: if the trigger shouldn't be processed yet
+        """
+        if logger:
+            self.logger = get_logger(logger)
+        now = timezone.now()
+        if not force and self.date_processed is not None:
+            # trigger has already been processed. So everything is fine
+            return False
+        if not force and self.process_after and self.process_after >= now:
+            raise ProcessLaterError(self.process_after)
+        return True
+
     def _process(self, dictionary):
         raise NotImplementedError()
 
-    def _handle_execution_failure(self, exception, use_statsd=False):
+    def _report_timings(self, timings, use_statsd=False, exception=None):
+        """
+        Send trigger_processed with how long processing took, and add the timings to the stats if necessary.
+        :param dict timings: the seconds of lock_wait, process_time and persist_time (or None if not measured)
+        :param bool use_statsd: whether to use statsd
+        :param Exception exception: the exception raised while processing, if any
+        """
+        lag = ((self.date_processed or timezone.now()) - self.date_received).total_seconds()
+        if use_statsd:
+            for name, seconds in dict(timings, lag=lag).items():
+                if seconds is not None:
+                    metrics.timing(self.trigger_type, '{}_seconds'.format(name), seconds)
+        trigger_processed.send(sender=type(self), trigger=self, lag=lag, exception=exception, **timings)
+
+    def save_state(self):
+        """
+        Save the fields that processing changes.
+        """
+        self.save(update_fields=self.state_fields)
+
+    async def asave_state(self):
+        """
+        Save the fields that processing changes, with the async ORM.
+        """
+        await self.asave(update_fields=self.state_fields)
+
+    @staticmethod
+    def save_states(triggers):
+        """
+        Save the fields that processing changes for many triggers (of any type), in a single UPDATE query.
+        """
+        Trigger.objects.bulk_update(triggers, Trigger.state_fields)
+
+    def _handle_execution_failure(self, exception, use_statsd=False, save=True):
         """
         Handle execution failure of the trigger
         :param Exception exception: the exception raised during failure
         :param bool use_statsd: whether to use statsd
+        :param bool save: whether to save the trigger
         :return: None
         """
         self.number_of_tries += 1
+        # Wait before retrying, if the retry policy says so
+        delay = get_retry_policy(self).get_delay(self.number_of_tries)
+        if delay is not None:
+            self.process_after = timezone.now() + delay
+
         # Log message if starts retrying too much
         if self.number_of_tries > getattr(settings, 'DJTRIGGERS_TRIES_BEFORE_WARNING', 3):
             # Set a limit for retries
@@ -152,33 +327,34 @@ class Trigger(models.Model):
                        try_count=self.number_of_tries)
             self.logger.log_message(self, message, level=level)
 
-        # Send stats to statsd if necessary
+        # Send stats to statsd (or the DJTRIGGERS_METRICS_BACKEND) if necessary
         if use_statsd:
-            from django_statsd.clients import statsd
-            statsd.incr('triggers.{trigger_type}.failed'.format(trigger_type=self.trigger_type))
+            metrics.incr(self.trigger_type, 'failed')
 
-        self.save()
+        if save:
+            self.save_state()
 
-    def _handle_execution_success(self, use_statsd=False):
+    def _handle_execution_success(self, use_statsd=False, save=True):
         """
         Handle execution success of the trigger
         :param bool use_statsd: whether to use statsd
+        :param bool save: whether to save the trigger
         :return: None
         """
         if self.date_processed is None:
             now = timezone.now()
             self.date_processed = now
 
-        # Send stats to statsd if necessary
+        # Send stats to statsd (or the DJTRIGGERS_METRICS_BACKEND) if necessary
         if use_statsd:
-            from django_statsd.clients import statsd
-            statsd.incr('triggers.{trigger_type}.processed'.format(trigger_type=self.trigger_type))
+            metrics.incr(self.trigger_type, 'processed')
             if self.date_processed and self.process_after:
-                statsd.timing('triggers.{trigger_type}.process_delay_seconds'.format(trigger_type=self.trigger_type),
-                              (self.date_processed - self.process_after).total_seconds())
+                metrics.timing(self.trigger_type, 'process_delay_seconds',
+                               (self.date_processed - self.process_after).total_seconds())
 
         self.successful = True
-        self.save()
+        if save:
+            self.save_state()
 
     def __repr__(self):
         return 'Trigger {trigger_id} of type {trigger_type} ({is_processed}processed)'.format(
@@ -186,8 +362,33 @@ class Trigger(models.Model):
 
 
 class TriggerResult(models.Model):
+    """
+    The result of processing a trigger, stored as set by DJTRIGGERS_RESULT_ENCODING (see djtriggers.results).
+    Use `value` to read it, whatever the encoding.
+    """
     trigger = models.ForeignKey(Trigger, on_delete=models.CASCADE)
-    result = models.TextField()
+    result = models.TextField(blank=True)
+    # How the result is stored, '' for plain text in result
+    encoding = models.CharField(max_length=8, blank=True, default='')
+    # The compressed result
+    payload = models.BinaryField(null=True, blank=True)
 
     def __repr__(self):
-        return self.result
+        value = self.value
+        return value if isinstance(value, str) else repr(value)
+
+    @classmethod
+    def from_result(cls, trigger, value, encoding=None):
+        """
+        Create (but don't save) the result of a trigger, encoded with DJTRIGGERS_RESULT_ENCODING or `encoding`.
+        """
+        instance = cls(trigger_id=trigger.id)
+        instance.encoding, instance.result, instance.payload = encode_result(value, encoding)
+        return instance
+
+    @property
+    def value(self):
+        """
+        The decoded result.
+        """
+        return decode_result(self.encoding, self.result, self.payload)
@@ -0,0 +1,147 @@
+from logging import getLogger
+from select import select
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .locking import get_redis
+
+
+logger = getLogger(__name__)
+
+NOTIFY_BACKENDS = ('redis', 'postgres')
+
+
+def get_notify_backend():
+    """
+    Get the configured notification backend, or None if notifications are disabled. Notifications wake up trigger
+    workers as soon as triggers are created, instead of letting them wait for their next poll.
+
+    DJTRIGGERS_NOTIFY_BACKEND can be:
+     - 'redis' to publish on a Redis channel of DJTRIGGERS_REDIS_URL, once the transaction that created the trigger
+       has been committed.
+     - 'postgres' to use PostgreSQL NOTIFY, which is delivered when the transaction is committed (and sent only once
+       for all triggers created in the same transaction).
+    """
+    backend = getattr(settings, 'DJTRIGGERS_NOTIFY_BACKEND', None)
+    if backend is not None and backend not in NOTIFY_BACKENDS:
+        raise ImproperlyConfigured('Unknown trigger notification backend {}, use one of {}'.format(
+            backend, ', '.join(NOTIFY_BACKENDS)))
+    return backend
+
+
+def get_notify_channel():
+    return getattr(settings, 'DJTRIGGERS_NOTIFY_CHANNEL', 'djtriggers')
+
+
+def notify_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Notify the trigger workers that new triggers were created on the database `using`. This is done automatically
+    when a trigger is saved, but bulk_create() doesn't send post_save signals.
+    """
+    backend = get_notify_backend()
+    if backend == 'redis':
+        transaction.on_commit(_publish, using=using)
+    elif backend == 'postgres':
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [get_notify_channel(), ''])
+
+
+def _publish():
+    try:
+        get_redis().publish(get_notify_channel(), '')
+    except Exception:
+        # Workers still find the triggers when they poll
+        logger.exception('Could not notify the trigger workers')
+
+
+def trigger_saved(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Notify the trigger workers when a trigger is created. This is connected to post_save.
+    """
+    from .models import Trigger
+
+    if created and not raw and issubclass(sender, Trigger):
+        notify_triggers(using)
+
+
+class RedisListener(object):
+    """
+    Listens on the Redis channel.
+    """
+    def __init__(self):
+        self.pubsub = get_redis().pubsub()
+        self.pubsub.subscribe(get_notify_channel())
+
+    def wait(self, timeout):
+        """
+        Wait for notifications.
+
+        :param float timeout: the maximum number of seconds to wait
+        :return: whether there was a notification
+        :rtype: bool
+        """
+        deadline = monotonic() + timeout
+        notified = False
+        message = self.pubsub.get_message(timeout=timeout)
+        # Handle all pending notifications at once, and keep waiting after other messages (e.g. subscribe replies)
+        while message is not None:
+            notified = notified or message['type'] == 'message'
+            message = self.pubsub.get_message(timeout=0 if notified else max(0, deadline - monotonic()))
+        return notified
+
+    def close(self):
+        self.pubsub.close()
+
+
+class PostgresListener(object):
+    """
+    Listens on the PostgreSQL channel, with a separate database connection.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections.create_connection(using)
+        with self.connection.cursor() as cursor:
+            cursor.execute('LISTEN {}'.format(self.connection.ops.quote_name(get_notify_channel())))
+
+    def wait(self, timeout):
+        """
+        Wait for notifications.
+
+        :param float timeout: the maximum number of seconds to wait
+        :return: whether there was a notification
+        :rtype: bool
+        """
+        connection = self.connection.connection
+        if not select([connection], [], [], timeout)[0]:
+            return False
+
+        # psycopg2
+        if hasattr(connection, 'poll'):
+            connection.poll()
+            notified = bool(connection.notifies)
+            connection.notifies.clear()
+            return notified
+
+        # psycopg 3
+        connection.pgconn.consume_input()
+        notified = False
+        while connection.pgconn.notifies() is not None:
+            notified = True
+        return notified
+
+    def close(self):
+        self.connection.close()
+
+
+def get_listener():
+    """
+    Get a listener for the notifications of the configured backend, or None if notifications are disabled.
+    """
+    backend = get_notify_backend()
+    if backend == 'redis':
+        return RedisListener()
+    if backend == 'postgres':
+        return PostgresListener()
+    return None
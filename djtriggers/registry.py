@@ -0,0 +1,184 @@
+from logging import getLogger
+
+from django.apps import apps
+from django.db.models import CASCADE
+from django.db.models.signals import class_prepared
+
+
+logger = getLogger(__name__)
+
+
+class TriggerRegistry(object):
+    """
+    Maps the 'typed' slug of every concrete Trigger subclass to its model class.
+
+    Trigger models are registered as soon as their class is prepared, and the
+    registry is completed from the installed models when the app is ready, so
+    callers don't have to scan all installed models on every run. Models of
+    apps that aren't installed (or of another app registry, e.g. isolated test
+    models) aren't registered, as their tables may not exist.
+    """
+    def __init__(self):
+        self._models = {}
+        self._names = {}
+        self._tables = {}
+        self._populated = False
+
+    def register(self, model):
+        """
+        Register a model, if it's a typed trigger.
+        """
+        # Check whether it's a typed trigger
+        if getattr(model, 'typed', None) is None or model._meta.abstract:
+            return
+
+        from .models import Trigger
+        if not issubclass(model, Trigger):
+            return
+
+        registered = self._models.get(model.typed)
+        if registered is model:
+            return
+        if registered is not None:
+            # A subclass that just inherits the slug of its parent doesn't replace it
+            if 'typed' in model.__dict__:
+                logger.warning('Trigger type %s is used by both %s and %s, ignoring the latter',
+                               model.typed, registered.__name__, model.__name__)
+            return
+
+        self._models[model.typed] = model
+        self._names[(model._meta.app_label, model._meta.model_name)] = model
+
+    @staticmethod
+    def _get_tables(model):
+        """
+        Get the tables with data of the triggers of a model, in the order they can be cleaned up: for every model in
+        its multi-table inheritance chain (child models first), the tables that refer to it, followed by its own table.
+        The main trigger table isn't included.
+
+        Tables that refer to triggers can only be cleaned up with a DELETE query when they're deleted on cascade and
+        nothing refers to them in turn. Otherwise (e.g. for SET_NULL, PROTECT or generic relations) the triggers need
+        to be deleted with the ORM, which follows all relations.
+
+        :return: the table names and the column that links them to the trigger id, and whether the triggers need to
+            be deleted with the ORM
+        :rtype: tuple of a list of (str, str) tuples and a bool
+        """
+        from .models import Trigger
+
+        concrete_model = model._meta.concrete_model
+        tables = []
+        needs_orm = False
+        for m in [concrete_model] + concrete_model._meta.get_parent_list():
+            if not issubclass(m, Trigger) or m._meta.abstract:
+                continue
+
+            for relation in m._meta.related_objects:
+                # Relations to parent models are handled with the parent, and child tables as part of the chain of
+                # their own trigger type
+                if relation.model._meta.concrete_model is not m or relation.parent_link:
+                    continue
+                if relation.many_to_many:
+                    # Custom through models show up as relations of their own
+                    if relation.through._meta.auto_created:
+                        tables.append((relation.through._meta.db_table, relation.field.m2m_reverse_name()))
+                    continue
+
+                related_meta = relation.related_model._meta
+                if relation.on_delete is not CASCADE or relation.field.target_field is not m._meta.pk or \
+                        related_meta.related_objects or related_meta.many_to_many or \
+                        any(f.is_relation and f.one_to_many for f in related_meta.private_fields):
+                    needs_orm = True
+                else:
+                    tables.append((related_meta.db_table, relation.field.column))
+
+            for field in m._meta.local_many_to_many:
+                if field.remote_field.through._meta.auto_created:
+                    tables.append((field.remote_field.through._meta.db_table, field.m2m_column_name()))
+            # Generic relations
+            if any(f.is_relation and f.one_to_many for f in m._meta.private_fields):
+                needs_orm = True
+
+            if m is not Trigger:
+                tables.append((m._meta.db_table, m._meta.pk.column))
+        return tables, needs_orm
+
+    def populate(self):
+        """
+        Register all typed triggers among the installed models.
+        """
+        for model in apps.get_models():
+            self.register(model)
+        self._populated = True
+
+    def _ensure_populated(self):
+        if not self._populated:
+            self.populate()
+
+    def get_model(self, trigger_type):
+        """
+        Get the model class for a trigger type, or None if the type is unknown.
+        """
+        self._ensure_populated()
+        return self._models.get(trigger_type)
+
+    def get_model_by_name(self, app_label, model_name):
+        """
+        Get a trigger model class by app label and model name, or None if it isn't a registered trigger.
+        """
+        self._ensure_populated()
+        return self._names.get((app_label, model_name.lower()))
+
+    def get_models(self):
+        """
+        Get all registered trigger model classes, in registration order.
+        """
+        self._ensure_populated()
+        return list(self._models.values())
+
+    def get_types(self):
+        """
+        Get all registered trigger types, in registration order.
+        """
+        self._ensure_populated()
+        return list(self._models.keys())
+
+    def _get_cleanup(self, trigger_type):
+        # Relations are only known once all models are loaded, so they're looked up when they're needed
+        self._ensure_populated()
+        if trigger_type not in self._tables:
+            from .models import Trigger
+            self._tables[trigger_type] = self._get_tables(self._models.get(trigger_type, Trigger))
+        return self._tables[trigger_type]
+
+    def get_tables(self, trigger_type):
+        """
+        Get the tables with data of the triggers of a type, including the tables that refer to them, in the order they
+        can be cleaned up (see _get_tables()). Unknown types only get the tables that refer to the main trigger table.
+
+        :return: the table names and the column that links them to the trigger id
+        :rtype: list of (str, str) tuples
+        """
+        return self._get_cleanup(trigger_type)[0]
+
+    def needs_orm_delete(self, trigger_type):
+        """
+        Get whether the triggers of a type have relations that can't simply be deleted with a DELETE query, so they
+        need to be deleted with the ORM.
+        """
+        return self._get_cleanup(trigger_type)[1]
+
+    def __contains__(self, trigger_type):
+        self._ensure_populated()
+        return trigger_type in self._models
+
+
+registry = TriggerRegistry()
+
+
+def _register_trigger_model(sender, **kwargs):
+    if sender._meta.apps is apps and sender._meta.app_config is not None:
+        registry.register(sender)
+
+
+class_prepared.connect(_register_trigger_model)
@@ -0,0 +1,121 @@
+from json import dumps, loads
+from zlib import compress, decompress
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# '' is plain text in the result column
+ENCODINGS = ('', 'json', 'zlib', 'zstd')
+TRUNCATION_MARKER = '\n[truncated {} characters]'
+
+
+def get_result_encoding(encoding=None):
+    """
+    Get how trigger results are stored, DJTRIGGERS_RESULT_ENCODING by default:
+     - '' (the default): as text.
+     - 'json': as JSON, so results that are lists or dicts are read back as such.
+     - 'zlib': as text, compressed with zlib.
+     - 'zstd': as text, compressed with Zstandard. This needs the zstandard package.
+
+    :rtype: str
+    """
+    if encoding is None:
+        encoding = getattr(settings, 'DJTRIGGERS_RESULT_ENCODING', None) or ''
+    if encoding not in ENCODINGS:
+        raise ImproperlyConfigured('Unknown trigger result encoding {}, use one of {}'.format(
+            encoding, ', '.join(repr(e) for e in ENCODINGS)))
+    if encoding == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured('The zstd trigger result encoding needs the zstandard package')
+    return encoding
+
+
+def _to_json(value):
+    # Iterables that JSON doesn't know about (e.g. sets or generators) are stored as lists, anything else as a string
+    if not isinstance(value, (str, bytes)):
+        try:
+            return list(value)
+        except TypeError:
+            pass
+    return str(value)
+
+
+def _truncate(text):
+    max_size = getattr(settings, 'DJTRIGGERS_RESULT_MAX_SIZE', None)
+    if max_size is None or len(text) <= max_size:
+        return text
+    return text[:max_size] + TRUNCATION_MARKER.format(len(text) - max_size)
+
+
+def encode_result(value, encoding=None):
+    """
+    Encode a trigger result. Results longer than DJTRIGGERS_RESULT_MAX_SIZE characters are truncated, and end with
+    a marker saying how much was cut off. Truncated JSON results are stored as a (JSON) string.
+
+    :param value: the result, anything else than a str is converted with str() unless it's stored as JSON (where
+        other iterables become lists)
+    :param str encoding: the encoding, defaults to get_result_encoding()
+    :return: the encoding, the text to store in the result column and the bytes to store in the payload column
+    :rtype: tuple
+    """
+    encoding = get_result_encoding(encoding)
+    if encoding == 'json':
+        text = dumps(value, default=_to_json)
+        truncated = _truncate(text)
+        return encoding, text if truncated is text else dumps(truncated), None
+
+    text = _truncate(value if isinstance(value, str) else str(value))
+    if encoding == 'zlib':
+        return encoding, '', compress(text.encode('utf-8'))
+    if encoding == 'zstd':
+        return encoding, '', zstandard.ZstdCompressor().compress(text.encode('utf-8'))
+    return encoding, text, None
+
+
+def decode_result(encoding, text, payload):
+    """
+    Decode a trigger result stored with encode_result().
+    """
+    if encoding == 'json':
+        return loads(text)
+    if encoding == 'zlib':
+        return decompress(bytes(payload)).decode('utf-8')
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured('Reading zstd trigger results needs the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(bytes(payload)).decode('utf-8')
+    return text
+
+
+def compact_trigger_results(encoding=None, batch_size=None):
+    """
+    Store the existing trigger results that are plain text with DJTRIGGERS_RESULT_ENCODING (or `encoding`), in
+    batches of DJTRIGGERS_RESULT_BATCH_SIZE (1000) results.
+
+    :return: the number of results that were converted
+    :rtype: int
+    """
+    from .models import TriggerResult
+
+    encoding = get_result_encoding(encoding)
+    if not encoding:
+        return 0
+    if batch_size is None:
+        batch_size = getattr(settings, 'DJTRIGGERS_RESULT_BATCH_SIZE', 1000)
+
+    nr_converted = 0
+    last_id = 0
+    while True:
+        results = list(TriggerResult.objects.filter(encoding='', id__gt=last_id).order_by('id')[:batch_size])
+        if not results:
+            return nr_converted
+
+        for result in results:
+            result.encoding, result.result, result.payload = encode_result(result.result, encoding)
+        TriggerResult.objects.bulk_update(results, ['encoding', 'result', 'payload'])
+        nr_converted += len(results)
+        last_id = results[-1].id
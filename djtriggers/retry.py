@@ -0,0 +1,81 @@
+from datetime import timedelta
+from random import random
+
+from django.conf import settings
+
+
+class RetryPolicy(object):
+    """
+    Decides when to retry a trigger that failed. This base policy retries right away, i.e. at the next run of
+    process_triggers.
+
+    Set DJTRIGGERS_RETRY_POLICY to a policy to use it for all triggers, or set retry_policy on a Trigger subclass to
+    use it for the triggers of that type.
+    """
+    def get_delay(self, number_of_tries):
+        """
+        Get how long to wait before retrying.
+
+        :param int number_of_tries: the number of times the trigger failed so far (at least 1)
+        :return: the delay, or None to retry right away
+        :rtype: timedelta
+        """
+        return None
+
+
+class BackoffPolicy(RetryPolicy):
+    """
+    A retry policy with a delay that grows with every try, up to `max_delay` seconds.
+
+    With `jitter` (a fraction between 0 and 1), every delay is shortened by a random part of up to that fraction, so
+    triggers that failed at the same time don't all retry at the same time. Use 1 for full jitter.
+    """
+    def __init__(self, max_delay=3600, jitter=0.5):
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def get_delay(self, number_of_tries):
+        seconds = min(self._get_seconds(number_of_tries), self.max_delay)
+        if self.jitter:
+            seconds *= 1 - self.jitter * random()
+        return timedelta(seconds=seconds)
+
+    def _get_seconds(self, number_of_tries):
+        raise NotImplementedError()
+
+
+class ExponentialBackoff(BackoffPolicy):
+    """
+    Wait `base_delay` seconds after the first try, and `factor` times longer after every next one.
+    """
+    def __init__(self, base_delay=30, factor=2, **kwargs):
+        super(ExponentialBackoff, self).__init__(**kwargs)
+        self.base_delay = base_delay
+        self.factor = factor
+
+    def _get_seconds(self, number_of_tries):
+        # Don't let the delay overflow for big numbers of tries
+        return self.base_delay * self.factor ** min(number_of_tries - 1, 64)
+
+
+class LinearBackoff(BackoffPolicy):
+    """
+    Wait `delay` seconds after the first try, and `delay` seconds longer after every next one.
+    """
+    def __init__(self, delay=60, **kwargs):
+        super(LinearBackoff, self).__init__(**kwargs)
+        self.delay = delay
+
+    def _get_seconds(self, number_of_tries):
+        return self.delay * number_of_tries
+
+
+def get_retry_policy(trigger):
+    """
+    Get the retry policy of a trigger: the retry_policy of its type, DJTRIGGERS_RETRY_POLICY, or retrying right away.
+
+    :rtype: RetryPolicy
+    """
+    if trigger.retry_policy is not None:
+        return trigger.retry_policy
+    return getattr(settings, 'DJTRIGGERS_RETRY_POLICY', None) or RetryPolicy()
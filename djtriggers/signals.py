@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.dispatch import Signal
+
+# Sent after a trigger was processed (successfully or not), by Trigger.process() and Trigger.aprocess(), with:
+#  - sender: the class of the trigger
+#  - trigger: the trigger
+#  - lock_wait: the seconds it took to lock the trigger, or None if it wasn't locked (e.g. because it was claimed)
+#  - process_time: the seconds _process() took
+#  - persist_time: the seconds it took to save the outcome, or None if the caller saves it together with other
+#    triggers (see Trigger.save_states())
+#  - lag: the seconds between date_received and the end of processing
+#  - exception: the exception _process() raised, or None
+# Receivers run in the processing thread, so keep them quick.
+trigger_processed = Signal()
+
+
+@contextmanager
+def measure(timings, name):
+    """
+    Store the seconds the block took in timings[name].
+    """
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = perf_counter() - started
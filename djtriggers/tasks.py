@@ -1,9 +1,10 @@
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
-from django.apps import apps
-
+from .loggers import flush_loggers
+from .metrics import metrics
 from .models import Trigger
+from .registry import registry
 
 
 logger = get_task_logger(__name__)
@@ -23,7 +24,21 @@ def clean_triggers():
 
 @shared_task
 def process_trigger(trigger_id, trigger_app_label, trigger_class, *args, **kwargs):
+    model = registry.get_model_by_name(trigger_app_label, trigger_class)
+    if model is None:
+        logger.warning('Unknown trigger model %s.%s', trigger_app_label, trigger_class)
+        return
+
     try:
-        apps.get_model(trigger_app_label, trigger_class).objects.get(id=trigger_id).process(*args, **kwargs)
+        model.objects.get(id=trigger_id).process(*args, **kwargs)
     except Trigger.DoesNotExist:
         pass
+    finally:
+        flush_loggers()
+        metrics.flush()
+
+
+@shared_task
+def process_trigger_batch(trigger_type, trigger_ids, *args, **kwargs):
+    from .logic import process_trigger_batch as process
+    process(trigger_type, trigger_ids, *args, **kwargs)
@@ -1,7 +1,7 @@
 from django.utils import timezone
 from factory import DjangoModelFactory
 
-from djtriggers.tests.models import DummyTrigger
+from djtriggers.tests.models import DummyTrigger, OtherDummyTrigger
 
 
 class DummyTriggerFactory(DjangoModelFactory):
@@ -14,3 +14,8 @@ class DummyTriggerFactory(DjangoModelFactory):
     date_processed = None
     process_after = None
     number_of_tries = 0
+
+
+class OtherDummyTriggerFactory(DummyTriggerFactory):
+    class Meta:
+        model = OtherDummyTrigger
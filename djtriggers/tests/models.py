@@ -9,3 +9,13 @@ class DummyTrigger(Trigger):
 
     def _process(self, dictionary):
         pass
+
+
+class OtherDummyTrigger(Trigger):
+    class Meta:
+        proxy = True
+
+    typed = 'other_dummy_trigger'
+
+    def _process(self, dictionary):
+        pass
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from mock import patch
+from pytest import raises
+
+from django.test import override_settings
+from django.test.testcases import TestCase
+from django.utils import timezone
+
+from djtriggers.claiming import claim_triggers, get_claim_token, release_triggers
+from djtriggers.logic import process_triggers
+from djtriggers.models import Trigger
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+
+
+class ClaimTriggersTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.token = get_claim_token()
+
+    def test_claim_due_triggers(self):
+        trigger = DummyTriggerFactory()
+        DummyTriggerFactory(process_after=self.now + timedelta(days=1))
+        DummyTriggerFactory(date_processed=self.now)
+
+        assert claim_triggers(self.token) == [(trigger.id, 'dummy_trigger')]
+        trigger.refresh_from_db()
+        assert trigger.claimed_by == self.token
+        assert trigger.claimed_until > self.now
+
+    def test_claim_limit(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        assert claim_triggers(self.token, limit=2) == [(t.id, 'dummy_trigger') for t in triggers[:2]]
+        assert claim_triggers(self.token, limit=2, after_id=triggers[1].id) == [(triggers[2].id, 'dummy_trigger')]
+
+    def test_claimed_by_other_worker(self):
+        trigger = DummyTriggerFactory()
+        assert claim_triggers(get_claim_token()) == [(trigger.id, 'dummy_trigger')]
+        assert claim_triggers(self.token) == []
+
+    def test_expired_claim(self):
+        trigger = DummyTriggerFactory(claimed_by='other', claimed_until=self.now - timedelta(seconds=1))
+        assert claim_triggers(self.token) == [(trigger.id, 'dummy_trigger')]
+
+    def test_release_triggers(self):
+        trigger = DummyTriggerFactory()
+        claim_triggers(self.token)
+        release_triggers('other', [trigger.id])
+        assert Trigger.objects.get(id=trigger.id).claimed_by == self.token
+
+        release_triggers(self.token, [trigger.id])
+        trigger.refresh_from_db()
+        assert trigger.claimed_by is None
+        assert trigger.claimed_until is None
+
+
+@override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True, DJTRIGGERS_CLAIM_BATCH_SIZE=2)
+class ClaimedExecutionTest(TestCase):
+    def test_process_claimed_triggers(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        with patch('djtriggers.models.redis_lock') as mock_lock:
+            process_triggers()
+        assert not mock_lock.called
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_save_batch_at_once(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        with patch.object(Trigger, 'save') as mock_save:
+            process_triggers()
+        assert not mock_save.called
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.successful is True
+
+    def test_release_unprocessed_triggers(self):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', side_effect=Exception), raises(Exception):
+            process_triggers()
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
+        assert trigger.number_of_tries == 1
+        assert trigger.claimed_by is None
+
+    @override_settings(DJTRIGGERS_ASYNC_HANDLING=True)
+    def test_keep_claim_of_dispatched_triggers(self):
+        trigger = DummyTriggerFactory()
+        with patch('djtriggers.logic.process_trigger.apply_async') as process_trigger_patch:
+            process_triggers()
+        assert process_trigger_patch.call_count == 1
+        trigger.refresh_from_db()
+        assert trigger.claimed_by is not None
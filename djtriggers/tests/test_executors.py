@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from mock import Mock, patch
+from pytest import raises
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.testcases import TestCase, TransactionTestCase
+
+from djtriggers.executors import (SerialExecutor, TriggerProcessPoolExecutor, TriggerThreadPoolExecutor,
+                                  get_executor, process_trigger_in_process)
+from djtriggers.logic import _submit_trigger, process_triggers
+from djtriggers.models import Trigger
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+
+
+class GetExecutorTest(TestCase):
+    def test_default(self):
+        assert isinstance(get_executor(), SerialExecutor)
+
+    @override_settings(DJTRIGGERS_EXECUTOR='thread', DJTRIGGERS_EXECUTOR_MAX_WORKERS=3)
+    def test_thread(self):
+        with get_executor() as executor:
+            assert isinstance(executor, TriggerThreadPoolExecutor)
+            assert executor.max_workers == 3
+
+    def test_process(self):
+        with get_executor('process', 2) as executor:
+            assert isinstance(executor, TriggerProcessPoolExecutor)
+            assert executor.max_workers == 2
+
+    def test_unknown(self):
+        with raises(ImproperlyConfigured):
+            get_executor('unknown')
+
+    def test_serial_executor(self):
+        executor = SerialExecutor()
+        assert executor.submit(sum, [1, 2]).result() == 3
+        assert isinstance(executor.submit(int, 'a').exception(), ValueError)
+
+
+class ProcessPoolTest(TestCase):
+    def test_submit_trigger(self):
+        trigger = DummyTriggerFactory()
+        executor = Mock(spec=TriggerProcessPoolExecutor)
+        _submit_trigger(executor, trigger, lock=False)
+        executor.submit.assert_called_once_with(process_trigger_in_process, 'djtriggers', 'DummyTrigger', trigger.id,
+                                                False, False)
+
+    def test_process_trigger_in_process(self):
+        trigger = DummyTriggerFactory()
+        process_trigger_in_process('djtriggers', 'DummyTrigger', trigger.id)
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+
+    @patch('djtriggers.metrics.metrics')
+    @patch('djtriggers.loggers.flush_loggers')
+    def test_process_trigger_in_process_flush(self, mock_flush_loggers, mock_metrics):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', side_effect=ValueError), raises(ValueError):
+            process_trigger_in_process('djtriggers', 'DummyTrigger', trigger.id)
+        assert mock_flush_loggers.called
+        assert mock_metrics.flush.called
+
+    @patch('djtriggers.executors.close_old_connections')
+    def test_process_trigger_in_process_connections(self, mock_close):
+        trigger = DummyTriggerFactory()
+        calls_before = []
+        with patch.object(DummyTrigger, 'process', side_effect=lambda *args, **kwargs: calls_before.append(
+                mock_close.call_count)):
+            process_trigger_in_process('djtriggers', 'DummyTrigger', trigger.id)
+        assert calls_before == [1]
+        assert mock_close.call_count == 2
+
+    def test_process_trigger_in_process_processed(self):
+        trigger = DummyTriggerFactory()
+        trigger.delete()
+        with patch.object(DummyTrigger, 'process') as mock_process:
+            process_trigger_in_process('djtriggers', 'DummyTrigger', trigger.id)
+        assert not mock_process.called
+
+
+class ThreadPoolTest(TransactionTestCase):
+    def test_process_triggers(self):
+        triggers = [DummyTriggerFactory() for _ in range(5)]
+        process_triggers(executor='thread', max_workers=2)
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_standard_executor(self):
+        triggers = [DummyTriggerFactory() for _ in range(5)]
+        with ThreadPoolExecutor(2) as executor:
+            assert process_triggers(executor=executor) == 5
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_raise_after_processing_all(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        with patch.object(DummyTrigger, '_process', side_effect=[None, ValueError, None]), raises(ValueError):
+            process_triggers(executor='thread', max_workers=1)
+        assert Trigger.objects.filter(id__in=[t.id for t in triggers], date_processed__isnull=False).count() == 2
+
+    @override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True)
+    def test_process_claimed_triggers(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        process_triggers(executor='thread')
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+            assert trigger.claimed_by is None
+
+
+class ProcessTriggersCommandTest(TestCase):
+    @patch('djtriggers.logic.process_triggers')
+    def test_command(self, mock_process_triggers):
+        call_command('process_triggers', '--executor', 'thread', '--max-workers', '4')
+        mock_process_triggers.assert_called_once_with(use_statsd=False, executor='thread', max_workers=4)
@@ -0,0 +1,66 @@
+from fakeredis import FakeRedis
+from mock import patch
+
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers.locking import get_redis, redis_lock, redis_locks
+
+
+@override_settings(DJTRIGGERS_REDIS_URL='redis://localhost:6379/0')
+class GetRedisTest(TestCase):
+    def test_reuse_pool(self):
+        assert get_redis().connection_pool is get_redis().connection_pool
+
+    @override_settings(DJTRIGGERS_REDIS_MAX_CONNECTIONS=5, DJTRIGGERS_REDIS_SOCKET_TIMEOUT=2)
+    def test_pool_settings(self):
+        pool = get_redis().connection_pool
+        assert pool.max_connections == 5
+        assert pool.connection_kwargs['socket_timeout'] == 2
+
+    def test_new_pool_after_fork(self):
+        pool = get_redis().connection_pool
+        with patch('djtriggers.locking.getpid', return_value=-1):
+            assert get_redis().connection_pool is not pool
+
+    def test_new_pool_for_other_url(self):
+        pool = get_redis().connection_pool
+        with override_settings(DJTRIGGERS_REDIS_URL='redis://localhost:6379/1'):
+            assert get_redis().connection_pool is not pool
+
+
+@override_settings(DJTRIGGERS_REDIS_URL='redis://localhost:6379/0')
+class RedisLocksTest(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('djtriggers.locking.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_acquire_all(self):
+        with redis_locks(['djtriggers-1', 'djtriggers-2']) as acquired:
+            assert acquired == {'djtriggers-1', 'djtriggers-2'}
+            assert self.redis.exists('djtriggers-1', 'djtriggers-2') == 2
+            assert self.redis.pttl('djtriggers-1') == -1
+        assert self.redis.exists('djtriggers-1', 'djtriggers-2') == 0
+
+    def test_skip_held_locks(self):
+        with redis_lock('djtriggers-1', blocking_timeout=0):
+            with redis_locks(['djtriggers-1', 'djtriggers-2']) as acquired:
+                assert acquired == {'djtriggers-2'}
+            # The lock held by someone else is not released
+            assert self.redis.exists('djtriggers-1')
+
+    def test_timeout(self):
+        with redis_locks(['djtriggers-1'], timeout=10):
+            assert 0 < self.redis.pttl('djtriggers-1') <= 10000
+
+    def test_no_names(self):
+        with redis_locks([]) as acquired:
+            assert acquired == set()
+
+
+class RedisLocksWithoutRedisTest(TestCase):
+    def test_acquire_all(self):
+        with redis_locks(['djtriggers-1', 'djtriggers-2']) as acquired:
+            assert acquired == {'djtriggers-1', 'djtriggers-2'}
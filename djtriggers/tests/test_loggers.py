@@ -0,0 +1,152 @@
+from logging import WARNING
+from threading import Event
+
+from mock import Mock, patch
+from pytest import raises
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers import loggers
+from djtriggers.loggers.background import BackgroundLogger
+from djtriggers.loggers.base import TriggerLogger
+from djtriggers.loggers.database import BufferedDatabaseLogger, BufferedDatabaseSerializeLogger
+from djtriggers.logic import process_triggers
+from djtriggers.models import TriggerResult
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+
+
+class BufferedDatabaseLoggerTest(TestCase):
+    def setUp(self):
+        with patch('djtriggers.loggers.database.register') as mock_register:
+            self.logger = BufferedDatabaseLogger()
+        mock_register.assert_called_once_with(self.logger.flush)
+
+    def test_flush(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        for trigger in triggers:
+            self.logger.log_result(trigger, 'result {}'.format(trigger.id))
+        assert not TriggerResult.objects.exists()
+
+        with self.assertNumQueries(1):
+            self.logger.flush()
+        assert sorted(TriggerResult.objects.values_list('trigger_id', 'result')) == [
+            (trigger.id, 'result {}'.format(trigger.id)) for trigger in triggers]
+
+        with self.assertNumQueries(0):
+            self.logger.flush()
+
+    @override_settings(DJTRIGGERS_LOGGER_BUFFER_SIZE=2)
+    def test_flush_when_full(self):
+        trigger = DummyTriggerFactory()
+        for _ in range(3):
+            self.logger.log_result(trigger, 'result')
+        assert TriggerResult.objects.count() == 2
+        assert len(self.logger.results) == 1
+
+    def test_serialize(self):
+        with patch('djtriggers.loggers.database.register'):
+            logger = BufferedDatabaseSerializeLogger()
+        trigger = DummyTriggerFactory()
+        logger.log_result(trigger, None)
+        logger.log_result(trigger, [1, 2])
+        logger.flush()
+        assert list(TriggerResult.objects.values_list('result', flat=True)) == ['1\n2']
+
+    def test_flush_after_processing(self):
+        triggers = [DummyTriggerFactory() for _ in range(2)]
+        with patch.dict(loggers.REGISTRY, {'BufferedDatabaseLogger': self.logger}), \
+                patch.object(DummyTrigger, '_logger_class', 'BufferedDatabaseLogger'), \
+                patch.object(DummyTrigger, '_process', return_value='done'):
+            process_triggers()
+        assert sorted(TriggerResult.objects.values_list('trigger_id', 'result')) == [
+            (trigger.id, 'done') for trigger in triggers]
+
+
+class BackgroundLoggerTest(TestCase):
+    def setUp(self):
+        self.wrapped = Mock(spec=TriggerLogger)
+        self.trigger = DummyTriggerFactory()
+
+    def get_logger(self, **kwargs):
+        with patch('djtriggers.loggers.background.register') as mock_register:
+            logger = BackgroundLogger(self.wrapped, **kwargs)
+        mock_register.assert_called_once_with(logger.close)
+        return logger
+
+    def block_writer(self, logger):
+        """
+        Keep the writer thread busy until the returned event is set.
+        """
+        started, release = Event(), Event()
+
+        def log_result(*args, **kwargs):
+            started.set()
+            release.wait(5)
+        self.wrapped.log_result.side_effect = log_result
+        logger.log_result(self.trigger, 'blocking')
+        started.wait(5)
+        return release
+
+    def test_write_in_background(self):
+        logger = self.get_logger()
+        logger.log_result(self.trigger, 'result')
+        logger.log_message(self.trigger, 'message', level=WARNING)
+        assert logger.flush(wait=True, timeout=5)
+
+        self.wrapped.log_result.assert_called_once_with(self.trigger, 'result', level=None)
+        self.wrapped.log_message.assert_called_once_with(self.trigger, 'message', level=WARNING)
+        assert self.wrapped.flush.called
+        assert logger._queue.empty()
+
+    def test_flush_without_records(self):
+        assert self.get_logger().flush(wait=True)
+        assert not self.wrapped.flush.called
+
+    def test_failing_logger(self):
+        logger = self.get_logger()
+        self.wrapped.log_result.side_effect = ValueError
+        logger.log_result(self.trigger, 'result')
+        logger.log_message(self.trigger, 'message')
+        assert logger.flush(wait=True, timeout=5)
+        assert self.wrapped.log_message.called
+
+    def test_drop_when_full(self):
+        logger = self.get_logger(max_size=1, full_policy='drop')
+        release = self.block_writer(logger)
+        for i in range(3):
+            logger.log_message(self.trigger, str(i))
+        release.set()
+        assert logger.flush(wait=True, timeout=5)
+
+        assert logger.dropped == 2
+        self.wrapped.log_message.assert_called_once_with(self.trigger, '0', level=None)
+
+    def test_sample_when_full(self):
+        logger = self.get_logger(max_size=1, full_policy='sample', sample_rate=0.5)
+        release = self.block_writer(logger)
+        logger.log_message(self.trigger, '0')
+        with patch('djtriggers.loggers.background.random', return_value=0.6):
+            logger.log_message(self.trigger, '1')
+        assert logger.dropped == 1
+
+        release.set()
+        with patch('djtriggers.loggers.background.random', return_value=0.4):
+            logger.log_message(self.trigger, '2')
+        assert logger.flush(wait=True, timeout=5)
+        assert [c[0][1] for c in self.wrapped.log_message.call_args_list] == ['0', '2']
+
+    def test_unknown_policy(self):
+        with raises(ImproperlyConfigured):
+            self.get_logger(full_policy='unknown')
+
+    def test_new_thread_after_fork(self):
+        logger = self.get_logger()
+        logger.log_message(self.trigger, 'message')
+        queue = logger._queue
+        with patch('djtriggers.loggers.background.getpid', return_value=-1):
+            logger.log_message(self.trigger, 'message')
+            assert logger._queue is not queue
+            assert logger.flush(wait=True, timeout=5)
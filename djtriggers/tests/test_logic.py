@@ -1,12 +1,20 @@
+from asgiref.sync import async_to_sync
+from asyncio import sleep
+from contextlib import contextmanager
 from datetime import timedelta
-from mock import patch
+from mock import call, patch
 
+from django.db import connection
 from django.test import override_settings
 from django.test.testcases import TestCase
 from django.utils import timezone
 
-from djtriggers.logic import process_triggers
-from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.logic import (_iterate_in_batches, aprocess_triggers, clean_triggers, process_trigger_batch,
+                              process_triggers)
+from djtriggers.models import Trigger, TriggerResult
+from djtriggers.registry import registry
+from djtriggers.tests.factories.triggers import DummyTriggerFactory, OtherDummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger, OtherDummyTrigger
 
 
 class SynchronousExecutionTest(TestCase):
@@ -37,6 +45,196 @@ class SynchronousExecutionTest(TestCase):
         trigger.refresh_from_db()
         assert trigger.date_processed == self.now
 
+    @override_settings(DJTRIGGERS_METRICS_BACKEND='null')
+    def test_stats_sent_once_per_batch(self):
+        triggers = [DummyTriggerFactory(process_after=self.now) for _ in range(3)]
+        with patch('djtriggers.metrics.NullBackend.send') as mock_send:
+            process_triggers(use_statsd=True)
+
+        mock_send.assert_called_once()
+        counters, timers = mock_send.call_args[0]
+        # Every trigger is counted once
+        assert counters == {('dummy_trigger', 'processed'): 3}
+        assert len(timers[('dummy_trigger', 'process_delay_seconds')]) == len(triggers)
+
+
+@override_settings(DJTRIGGERS_SINGLE_QUERY_POLLING=True)
+class SingleQueryPollingTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_process_due_triggers(self):
+        trigger = DummyTriggerFactory(process_after=self.now - timedelta(days=1))
+        later_trigger = DummyTriggerFactory(process_after=self.now + timedelta(days=1))
+        processed_trigger = DummyTriggerFactory(date_processed=self.now)
+        process_triggers()
+        trigger.refresh_from_db()
+        later_trigger.refresh_from_db()
+        processed_trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+        assert later_trigger.date_processed is None
+        assert processed_trigger.date_processed == self.now
+
+    def test_process_with_matching_model(self):
+        dummy_trigger = DummyTriggerFactory()
+        other_trigger = OtherDummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process') as dummy_process, \
+                patch.object(OtherDummyTrigger, '_process') as other_process:
+            process_triggers()
+        assert dummy_process.call_count == 1
+        assert other_process.call_count == 1
+        dummy_trigger.refresh_from_db()
+        other_trigger.refresh_from_db()
+        assert dummy_trigger.trigger_type == 'dummy_trigger'
+        assert other_trigger.trigger_type == 'other_dummy_trigger'
+
+    def test_number_of_queries(self):
+        DummyTriggerFactory()
+        # The due triggers of the (only) priority, and a query per priority to find the priorities
+        with patch.object(DummyTrigger, 'process'), self.assertNumQueries(2 + 2):
+            process_triggers()
+
+    def test_unknown_type(self):
+        trigger = DummyTriggerFactory()
+        Trigger.objects.filter(id=trigger.id).update(trigger_type='unknown_trigger')
+        process_triggers()
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
+
+
+@override_settings(DJTRIGGERS_BATCH_SIZE=2)
+class StreamingTest(TestCase):
+    def test_process_in_batches(self):
+        triggers = [DummyTriggerFactory() for _ in range(5)]
+        with patch('djtriggers.logic._iterate_in_batches', wraps=_iterate_in_batches) as mock_iterate:
+            process_triggers()
+        assert mock_iterate.called
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    @override_settings(DJTRIGGERS_SINGLE_QUERY_POLLING=True)
+    def test_process_in_batches_single_query(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)] + [OtherDummyTriggerFactory() for _ in range(2)]
+        with self.assertNumQueries(2 + 3 + 4 + 5):
+            # The priorities, three batches with one or two types each, and a save per trigger
+            process_triggers()
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_iterate_in_batches(self):
+        triggers = [DummyTriggerFactory() for _ in range(4)]
+        batches = list(_iterate_in_batches(Trigger.objects.values_list('id', 'trigger_type'), 2))
+        assert [[trigger_id for trigger_id, _ in batch] for batch in batches] == [
+            [trigger.id for trigger in triggers[:2]],
+            [trigger.id for trigger in triggers[2:]],
+        ]
+
+    @override_settings(DJTRIGGERS_MAX_PER_TICK=3)
+    def test_max_per_tick(self):
+        for _ in range(5):
+            DummyTriggerFactory()
+        process_triggers()
+        assert Trigger.objects.filter(date_processed__isnull=False).count() == 3
+
+    @override_settings(DJTRIGGERS_MAX_PER_TICK=3, DJTRIGGERS_CLAIM_TRIGGERS=True, DJTRIGGERS_CLAIM_BATCH_SIZE=2)
+    def test_max_per_tick_claimed(self):
+        for _ in range(5):
+            DummyTriggerFactory()
+        process_triggers()
+        assert Trigger.objects.filter(date_processed__isnull=False).count() == 3
+
+
+class AsyncioExecutionTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_process_due_triggers(self):
+        triggers = [DummyTriggerFactory(), OtherDummyTriggerFactory(process_after=self.now - timedelta(days=1))]
+        later_trigger = DummyTriggerFactory(process_after=self.now + timedelta(days=1))
+        async_to_sync(aprocess_triggers)()
+
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+        later_trigger.refresh_from_db()
+        assert later_trigger.date_processed is None
+
+    @override_settings(DJTRIGGERS_BATCH_SIZE=2)
+    def test_limit_concurrency(self):
+        running = []
+        max_running = []
+
+        async def process(trigger, dictionary):
+            running.append(trigger.id)
+            max_running.append(len(running))
+            await sleep(0)
+            running.remove(trigger.id)
+
+        for _ in range(5):
+            DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', process):
+            async_to_sync(aprocess_triggers)(concurrency=1)
+
+        assert len(max_running) == 5
+        assert max(max_running) == 1
+
+    def test_raise_unexpected_error_after_batch(self):
+        triggers = [DummyTriggerFactory(), DummyTriggerFactory()]
+        with patch.object(DummyTrigger, '_process', side_effect=[ValueError, None]), \
+                self.assertRaises(ValueError):
+            async_to_sync(aprocess_triggers)()
+
+        assert sorted(Trigger.objects.get(id=trigger.id).number_of_tries for trigger in triggers) == [0, 1]
+
+
+@override_settings(DJTRIGGERS_BATCH_LOCKING=True, DJTRIGGERS_LOCK_BATCH_SIZE=2)
+class BatchLockingTest(TestCase):
+    def test_process_locked_triggers(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        with patch('djtriggers.models.redis_lock') as mock_lock:
+            process_triggers()
+        assert not mock_lock.called
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_skip_triggers_locked_elsewhere(self):
+        locked_trigger = DummyTriggerFactory()
+        trigger = DummyTriggerFactory()
+
+        @contextmanager
+        def mock_redis_locks(names, **kwargs):
+            yield set(names) - {'djtriggers-{}'.format(locked_trigger.id)}
+
+        with patch('djtriggers.logic.redis_locks', side_effect=mock_redis_locks) as mock_locks:
+            process_triggers()
+        assert mock_locks.call_count == 1
+        locked_trigger.refresh_from_db()
+        trigger.refresh_from_db()
+        assert locked_trigger.date_processed is None
+        assert trigger.date_processed is not None
+
+    def test_skip_triggers_processed_before_locking(self):
+        processed_trigger = DummyTriggerFactory()
+        trigger = DummyTriggerFactory()
+
+        @contextmanager
+        def mock_redis_locks(names, **kwargs):
+            # Another worker processes the trigger in between fetching and locking it
+            Trigger.objects.filter(id=processed_trigger.id).update(date_processed=timezone.now(), successful=False)
+            yield set(names)
+
+        with patch('djtriggers.logic.redis_locks', side_effect=mock_redis_locks), \
+                patch.object(DummyTrigger, '_process') as mock_process:
+            process_triggers()
+        assert mock_process.call_count == 1
+        processed_trigger.refresh_from_db()
+        trigger.refresh_from_db()
+        assert processed_trigger.successful is False
+        assert trigger.successful
+
 
 class AsynchronousExecutionTest(TestCase):
     def setUp(self):
@@ -71,3 +269,201 @@ class AsynchronousExecutionTest(TestCase):
         with patch('djtriggers.logic.process_trigger.apply_async') as process_trigger_patch:
             process_triggers()
             assert not process_trigger_patch.called
+
+
+@override_settings(DJTRIGGERS_ASYNC_HANDLING=True, DJTRIGGERS_CELERY_BATCH_SIZE=2)
+class BatchedAsynchronousExecutionTest(TestCase):
+    def test_dispatch_batches(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        other_trigger = OtherDummyTriggerFactory()
+        with patch('djtriggers.logic.process_trigger_batch_task.apply_async') as mock_apply_async, \
+                patch('djtriggers.logic.process_trigger.apply_async') as process_trigger_patch:
+            process_triggers()
+        assert not process_trigger_patch.called
+        assert mock_apply_async.call_args_list == [
+            call(('dummy_trigger', [triggers[0].id, triggers[1].id]), {'use_statsd': False}, max_retries=0),
+            call(('dummy_trigger', [triggers[2].id]), {'use_statsd': False}, max_retries=0),
+            call(('other_dummy_trigger', [other_trigger.id]), {'use_statsd': False}, max_retries=0),
+        ]
+
+    def test_process_trigger_batch(self):
+        triggers = [DummyTriggerFactory() for _ in range(2)]
+        processed_trigger = DummyTriggerFactory(date_processed=timezone.now())
+        with patch.object(DummyTrigger, '_process') as mock_process, self.assertNumQueries(2):
+            # One query to fetch the triggers and one to save them
+            process_trigger_batch('dummy_trigger', [trigger.id for trigger in triggers + [processed_trigger]])
+        assert mock_process.call_count == 2
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.date_processed is not None
+
+    def test_process_trigger_batch_unknown_type(self):
+        trigger = DummyTriggerFactory()
+        process_trigger_batch('unknown_trigger', [trigger.id])
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
+
+
+class PriorityTest(TestCase):
+    def process_order(self):
+        processed = []
+        with patch.object(Trigger, 'process', autospec=True, side_effect=lambda trigger, **kwargs:
+                          processed.append(trigger.id)):
+            process_triggers()
+        return processed
+
+    def test_default_priority(self):
+        assert DummyTriggerFactory().priority == 0
+        assert DummyTriggerFactory(priority=5).priority == 5
+        with patch.object(DummyTrigger, 'default_priority', 10):
+            trigger = DummyTriggerFactory()
+            assert trigger.priority == 10
+            trigger.priority = 3
+            trigger.save()
+            assert DummyTrigger.objects.get(id=trigger.id).priority == 3
+
+    def test_types_with_higher_default_priority_first(self):
+        trigger = DummyTriggerFactory()
+        other_trigger = OtherDummyTriggerFactory()
+        with patch.object(OtherDummyTrigger, 'default_priority', 10):
+            assert self.process_order() == [other_trigger.id, trigger.id]
+
+    @override_settings(DJTRIGGERS_PRIORITY_LANES=True)
+    def test_lanes(self):
+        triggers = [DummyTriggerFactory(), OtherDummyTriggerFactory(priority=-1), DummyTriggerFactory(priority=5),
+                    OtherDummyTriggerFactory(priority=5), DummyTriggerFactory(priority=1)]
+        DummyTriggerFactory(priority=10, date_processed=timezone.now())
+        expected = [triggers[i].id for i in (2, 3, 4, 0, 1)]
+        assert self.process_order() == expected
+        with override_settings(DJTRIGGERS_SINGLE_QUERY_POLLING=True):
+            assert self.process_order() == expected
+        with override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True):
+            assert self.process_order() == expected
+
+    def test_lanes_without_setting(self):
+        triggers = [DummyTriggerFactory(), OtherDummyTriggerFactory(priority=5), DummyTriggerFactory(priority=5)]
+        expected = [triggers[i].id for i in (1, 2, 0)]
+        # Pages of ascending ids can't be ordered by priority, so these always use lanes
+        with override_settings(DJTRIGGERS_SINGLE_QUERY_POLLING=True):
+            assert self.process_order() == expected
+        with override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True):
+            assert self.process_order() == expected
+
+    @override_settings(DJTRIGGERS_PRIORITY_LANES=True)
+    def test_lane_queries(self):
+        DummyTriggerFactory(priority=1)
+        DummyTriggerFactory()
+        with patch.object(DummyTrigger, 'process'), self.assertNumQueries(2 * 3 + 1):
+            # A query per priority (and one to find out there are no more), and one per type for every priority
+            process_triggers()
+
+    @override_settings(DJTRIGGERS_ASYNC_HANDLING=True,
+                       DJTRIGGERS_CELERY_PRIORITY_QUEUES={10: 'triggers-urgent', 0: 'triggers'})
+    def test_priority_queues(self):
+        triggers = [DummyTriggerFactory(priority=20), DummyTriggerFactory(priority=10), DummyTriggerFactory(),
+                    DummyTriggerFactory(priority=-1)]
+        with patch('djtriggers.logic.process_trigger.apply_async') as mock_apply_async:
+            process_triggers()
+        assert mock_apply_async.call_args_list == [
+            call((triggers[0].id, 'djtriggers', 'DummyTrigger'), {'use_statsd': False}, max_retries=0,
+                 queue='triggers-urgent'),
+            call((triggers[1].id, 'djtriggers', 'DummyTrigger'), {'use_statsd': False}, max_retries=0,
+                 queue='triggers-urgent'),
+            call((triggers[2].id, 'djtriggers', 'DummyTrigger'), {'use_statsd': False}, max_retries=0,
+                 queue='triggers'),
+            call((triggers[3].id, 'djtriggers', 'DummyTrigger'), {'use_statsd': False}, max_retries=0),
+        ]
+
+    @override_settings(DJTRIGGERS_ASYNC_HANDLING=True, DJTRIGGERS_CELERY_BATCH_SIZE=2,
+                       DJTRIGGERS_CELERY_PRIORITY_QUEUES={10: 'triggers-urgent'})
+    def test_priority_queues_batches(self):
+        triggers = [DummyTriggerFactory(priority=10), DummyTriggerFactory(), DummyTriggerFactory(priority=10)]
+        with patch('djtriggers.logic.process_trigger_batch_task.apply_async') as mock_apply_async:
+            process_triggers()
+        assert mock_apply_async.call_args_list == [
+            call(('dummy_trigger', [triggers[0].id, triggers[2].id]), {'use_statsd': False}, max_retries=0,
+                 queue='triggers-urgent'),
+            call(('dummy_trigger', [triggers[1].id]), {'use_statsd': False}, max_retries=0),
+        ]
+
+
+class CleanTriggersTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def test_clean_expired_triggers(self):
+        expired_trigger = DummyTriggerFactory(date_processed=self.now - timedelta(days=90))
+        TriggerResult.objects.create(trigger=expired_trigger, result='done')
+        trigger = DummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+        TriggerResult.objects.create(trigger=trigger, result='done')
+        unprocessed_trigger = DummyTriggerFactory()
+
+        assert clean_triggers() == 1
+        assert set(Trigger.objects.values_list('id', flat=True)) == {trigger.id, unprocessed_trigger.id}
+        assert list(TriggerResult.objects.values_list('trigger_id', flat=True)) == [trigger.id]
+
+    @patch('djtriggers.logic.sleep')
+    def test_clean_in_chunks(self, mock_sleep):
+        for _ in range(5):
+            DummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+
+        assert clean_triggers(expiration_dt=self.now, chunk_size=2, chunk_sleep=1) == 5
+        assert not Trigger.objects.exists()
+        assert mock_sleep.call_count == 2
+
+    def test_clean_type_tables(self):
+        expired_trigger = DummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+        other_trigger = OtherDummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+        trigger = DummyTriggerFactory()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE dummy_trigger_data (trigger_ptr_id integer, other_id integer)')
+            for t in (expired_trigger, other_trigger, trigger):
+                cursor.execute('INSERT INTO dummy_trigger_data VALUES (%s, %s)', [t.id, t.id])
+
+        assert clean_triggers(expiration_dt=self.now,
+                              type_to_table={'dummy_trigger': 'dummy_trigger_data',
+                                             'other_dummy_trigger': (('dummy_trigger_data', 'other_id'),)}) == 2
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT trigger_ptr_id FROM dummy_trigger_data')
+            assert cursor.fetchall() == [(trigger.id,)]
+
+    def test_clean_model_tables(self):
+        expired_trigger = DummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+        trigger = DummyTriggerFactory()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE dummy_trigger_data (trigger_ptr_id integer)')
+            for t in (expired_trigger, trigger):
+                cursor.execute('INSERT INTO dummy_trigger_data VALUES (%s)', [t.id])
+
+        with patch.object(registry, 'get_tables', return_value=[('dummy_trigger_data', 'trigger_ptr_id')]):
+            assert clean_triggers(expiration_dt=self.now, type_to_table={}) == 1
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT trigger_ptr_id FROM dummy_trigger_data')
+            assert cursor.fetchall() == [(trigger.id,)]
+
+    def test_clean_related_tables(self):
+        expired_trigger = DummyTriggerFactory(date_processed=self.now - timedelta(days=1))
+        trigger = DummyTriggerFactory()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE dummy_attachment (trigger_id integer REFERENCES djtriggers_trigger (id))')
+            for t in (expired_trigger, trigger):
+                cursor.execute('INSERT INTO dummy_attachment VALUES (%s)', [t.id])
+
+        tables = [('dummy_attachment', 'trigger_id')] + registry.get_tables('dummy_trigger')
+        with patch.object(registry, 'get_tables', return_value=tables):
+            assert clean_triggers(expiration_dt=self.now, type_to_table={}) == 1
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT trigger_id FROM dummy_attachment')
+            assert cursor.fetchall() == [(trigger.id,)]
+
+    def test_clean_with_orm(self):
+        expired_triggers = [DummyTriggerFactory(date_processed=self.now - timedelta(days=1)) for _ in range(2)]
+        TriggerResult.objects.create(trigger=expired_triggers[0], result='done')
+        trigger = DummyTriggerFactory()
+
+        with patch.object(registry, 'needs_orm_delete', return_value=True), \
+                patch.object(registry, 'get_tables') as mock_get_tables:
+            assert clean_triggers(expiration_dt=self.now, type_to_table={}) == 2
+        assert not mock_get_tables.called
+        assert list(Trigger.objects.values_list('id', flat=True)) == [trigger.id]
+        assert not TriggerResult.objects.exists()
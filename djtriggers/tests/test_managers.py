@@ -0,0 +1,185 @@
+from datetime import timedelta
+
+from mock import patch
+from pytest import raises
+
+from django.db import connection, models
+from django.test import override_settings
+from django.test.testcases import TestCase, TransactionTestCase
+from django.test.utils import isolate_apps
+from django.utils import timezone
+
+from djtriggers.models import Trigger
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger, OtherDummyTrigger
+
+
+class BulkEnqueueTest(TestCase):
+    def test_bulk_enqueue(self):
+        process_after = timezone.now() + timedelta(hours=1)
+        with self.assertNumQueries(2):
+            triggers = DummyTrigger.objects.bulk_enqueue(['a', ('b', 1)], process_after=process_after, batch_size=1)
+
+        assert [trigger.id for trigger in triggers] == list(
+            DummyTrigger.objects.order_by('id').values_list('id', flat=True))
+        assert [(t.trigger_type, t.source, t.process_after) for t in DummyTrigger.objects.order_by('id')] == [
+            ('dummy_trigger', 'a', process_after),
+            ('dummy_trigger', 'b$1', process_after),
+        ]
+
+    def test_fields(self):
+        trigger, = DummyTrigger.objects.bulk_enqueue(['a'], number_of_tries=2)
+        assert DummyTrigger.objects.get(id=trigger.id).number_of_tries == 2
+
+    def test_skip_duplicates(self):
+        DummyTriggerFactory(source='a')
+        DummyTriggerFactory(source='b', date_processed=timezone.now())
+        OtherDummyTrigger.objects.bulk_enqueue(['c'])
+
+        with self.assertNumQueries(4):
+            triggers = DummyTrigger.objects.bulk_enqueue(['a', 'b', 'c', 'b', 'd', 'a'], skip_duplicates=True,
+                                                         batch_size=3)
+        assert [trigger.source for trigger in triggers] == ['b', 'c', 'd']
+
+    def test_nothing_to_enqueue(self):
+        DummyTriggerFactory(source='a')
+        with self.assertNumQueries(1):
+            assert DummyTrigger.objects.bulk_enqueue(['a'], skip_duplicates=True) == []
+
+    @override_settings(DJTRIGGERS_ENQUEUE_BATCH_SIZE=2)
+    def test_batch_size_setting(self):
+        with self.assertNumQueries(3):
+            DummyTrigger.objects.bulk_enqueue(['a', 'b', 'c', 'd', 'e'])
+
+    def test_untyped_model(self):
+        with raises(TypeError):
+            Trigger.objects.bulk_enqueue(['a'])
+
+    def test_notify(self):
+        with patch('djtriggers.notifications.notify_triggers') as mock_notify:
+            DummyTrigger.objects.bulk_enqueue(['a', 'b'], batch_size=1)
+        mock_notify.assert_called_once_with('default')
+
+
+@isolate_apps('djtriggers')
+class EnqueueOnceTest(TestCase):
+    def setUp(self):
+        class UniqueTrigger(DummyTrigger):
+            unique_source = True
+
+            class Meta:
+                proxy = True
+
+        # Set the type afterwards, so the model doesn't end up in the global registry
+        UniqueTrigger.typed = 'unique_trigger'
+        self.model = UniqueTrigger
+
+    def test_enqueue_once(self):
+        with self.assertNumQueries(1):
+            trigger = self.model.objects.enqueue_once(('customer', 1), process_after=timezone.now())
+        assert trigger.id is not None
+        assert self.model.objects.get(id=trigger.id).source == 'customer$1'
+
+        with self.assertNumQueries(1):
+            assert self.model.objects.enqueue_once(('customer', 1)) is None
+        assert self.model.objects.enqueue_once(('customer', 2)) is not None
+        assert self.model.objects.filter(trigger_type='unique_trigger').count() == 2
+
+    def test_enqueue_again_after_processing(self):
+        trigger = self.model.objects.enqueue_once('a')
+        trigger.process()
+        assert self.model.objects.enqueue_once('a') is not None
+
+    def test_other_types_are_not_unique(self):
+        self.model.objects.enqueue_once('a')
+        DummyTrigger.objects.bulk_enqueue(['a', 'a'])
+        with raises(TypeError):
+            DummyTrigger.objects.enqueue_once('a')
+
+    def test_without_on_conflict(self):
+        with patch.object(type(connection.features), 'supports_ignore_conflicts', False):
+            assert self.model.objects.enqueue_once('a') is not None
+            assert self.model.objects.enqueue_once('a') is None
+        assert self.model.objects.filter(trigger_type='unique_trigger').count() == 1
+
+    def test_bulk_enqueue_conflicts(self):
+        # E.g. enqueued concurrently, in between checking for duplicates and inserting
+        existing = self.model.objects.enqueue_once('b')
+        with patch.object(self.model._base_manager, 'using', return_value=self.model.objects.none()):
+            triggers = self.model.objects.bulk_enqueue(['a', 'b', 'c', 'a'], skip_duplicates=True)
+        assert [trigger.source for trigger in triggers] == ['a', 'c']
+        assert sorted(self.model.objects.filter(trigger_type='unique_trigger').values_list('id', 'source')) == \
+            sorted([(existing.id, 'b')] + [(trigger.id, trigger.source) for trigger in triggers])
+
+    def test_bulk_enqueue_without_on_conflict(self):
+        self.model.objects.enqueue_once('b')
+        with patch.object(type(connection.features), 'supports_ignore_conflicts', False):
+            triggers = self.model.objects.bulk_enqueue(['a', 'b', 'a'])
+        assert [trigger.source for trigger in triggers] == ['a']
+        assert self.model.objects.filter(trigger_type='unique_trigger').count() == 2
+
+    def test_notify(self):
+        with patch('djtriggers.notifications.notify_triggers') as mock_notify:
+            self.model.objects.enqueue_once('a')
+            self.model.objects.enqueue_once('a')
+        mock_notify.assert_called_once_with('default')
+
+
+@isolate_apps('djtriggers')
+class MultiTableBulkEnqueueTest(TransactionTestCase):
+    def setUp(self):
+        class ParentTrigger(Trigger):
+            parent_data = models.IntegerField(default=1)
+
+        class ChildTrigger(ParentTrigger):
+            child_data = models.IntegerField(default=2)
+
+        # Set the type afterwards, so the model doesn't end up in the global registry
+        ChildTrigger.typed = 'child_trigger'
+        self.model = ChildTrigger
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(ParentTrigger)
+            schema_editor.create_model(ChildTrigger)
+
+        def drop_tables():
+            with connection.schema_editor() as schema_editor:
+                schema_editor.delete_model(ChildTrigger)
+                schema_editor.delete_model(ParentTrigger)
+        self.addCleanup(drop_tables)
+
+    def test_bulk_enqueue(self):
+        # An INSERT per table, in a transaction
+        with self.assertNumQueries(5):
+            triggers = self.model.objects.bulk_enqueue(['a', 'b'], child_data=3)
+
+        assert [(t.id, t.trigger_type, t.source, t.parent_data, t.child_data)
+                for t in self.model.objects.order_by('id')] == [
+            (triggers[0].id, 'child_trigger', 'a', 1, 3),
+            (triggers[1].id, 'child_trigger', 'b', 1, 3),
+        ]
+
+    def test_enqueue_once(self):
+        self.model.unique_source = True
+        self.addCleanup(setattr, self.model, 'unique_source', False)
+
+        trigger = self.model.objects.enqueue_once('a', child_data=3)
+        assert self.model.objects.enqueue_once('a') is None
+        assert [(t.id, t.child_data) for t in self.model.objects.all()] == [(trigger.id, 3)]
+
+    def test_bulk_enqueue_once(self):
+        self.model.unique_source = True
+        self.addCleanup(setattr, self.model, 'unique_source', False)
+
+        existing = self.model.objects.enqueue_once('b', child_data=4)
+        triggers = self.model.objects.bulk_enqueue(['a', 'b', 'c'], child_data=3)
+        assert [t.source for t in triggers] == ['a', 'c']
+        assert [(t.id, t.source, t.child_data) for t in self.model.objects.order_by('id')] == [
+            (existing.id, 'b', 4),
+            (triggers[0].id, 'a', 3),
+            (triggers[1].id, 'c', 3),
+        ]
+
+    def test_save_one_by_one(self):
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            triggers = self.model.objects.bulk_enqueue(['a', 'b'])
+        assert [t.source for t in self.model.objects.filter(id__in=[t.id for t in triggers])] == ['a', 'b']
@@ -0,0 +1,80 @@
+from mock import MagicMock, patch
+from pytest import raises
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers.metrics import Metrics, NullBackend, PrometheusBackend, StatsdBackend, get_metrics_backend
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        with patch('djtriggers.metrics.Finalize') as mock_finalize:
+            self.metrics = Metrics()
+        mock_finalize.assert_called_once_with(None, self.metrics.flush, exitpriority=0)
+
+    @patch('djtriggers.metrics.NullBackend.send')
+    @override_settings(DJTRIGGERS_METRICS_BACKEND='null')
+    def test_aggregate(self, mock_send):
+        self.metrics.incr('a', 'processed')
+        self.metrics.incr('a', 'processed')
+        self.metrics.incr('b', 'failed', 2)
+        self.metrics.timing('a', 'process_delay_seconds', 1.5)
+        self.metrics.timing('a', 'process_delay_seconds', 3)
+        assert not mock_send.called
+
+        self.metrics.flush()
+        mock_send.assert_called_once_with({('a', 'processed'): 2, ('b', 'failed'): 2},
+                                          {('a', 'process_delay_seconds'): [1.5, 3]})
+
+        # Nothing left to send
+        self.metrics.flush()
+        assert mock_send.call_count == 1
+
+    @patch('djtriggers.metrics.NullBackend.send')
+    @override_settings(DJTRIGGERS_METRICS_BACKEND='null', DJTRIGGERS_METRICS_FLUSH_INTERVAL=0)
+    def test_flush_interval(self, mock_send):
+        self.metrics.incr('a', 'processed')
+        mock_send.assert_called_once_with({('a', 'processed'): 1}, {})
+
+    @patch('djtriggers.metrics.NullBackend.send', side_effect=OSError)
+    @override_settings(DJTRIGGERS_METRICS_BACKEND='null')
+    def test_failing_backend(self, mock_send):
+        self.metrics.incr('a', 'processed')
+        self.metrics.flush()
+        assert mock_send.called
+        assert not self.metrics.counters
+
+
+class MetricsBackendTest(TestCase):
+    def test_get_backend(self):
+        assert isinstance(get_metrics_backend(), StatsdBackend)
+        with override_settings(DJTRIGGERS_METRICS_BACKEND='null'):
+            assert isinstance(get_metrics_backend(), NullBackend)
+        with override_settings(DJTRIGGERS_METRICS_BACKEND='unknown'), raises(ImproperlyConfigured):
+            get_metrics_backend()
+
+    @patch('django_statsd.clients.statsd')
+    def test_statsd(self, mock_statsd):
+        pipeline = mock_statsd.pipeline.return_value.__enter__.return_value
+        StatsdBackend().send({('a', 'processed'): 2}, {('a', 'process_delay_seconds'): [1, 2]})
+
+        pipeline.incr.assert_called_once_with('triggers.a.processed', 2)
+        assert [c[0] for c in pipeline.timing.call_args_list] == [
+            ('triggers.a.process_delay_seconds', 1), ('triggers.a.process_delay_seconds', 2)]
+
+    def test_prometheus(self):
+        mock_prometheus = MagicMock()
+        with patch('djtriggers.metrics.prometheus_client', mock_prometheus), \
+                patch('djtriggers.metrics._prometheus_metrics', {}):
+            PrometheusBackend().send({('a', 'processed'): 2}, {('a', 'process_delay_seconds'): [1]})
+
+        mock_prometheus.Counter.assert_called_once_with('djtriggers_processed', 'django-triggers processed',
+                                                        ['trigger_type'])
+        mock_prometheus.Counter.return_value.labels.return_value.inc.assert_called_once_with(2)
+        mock_prometheus.Histogram.return_value.labels.return_value.observe.assert_called_once_with(1)
+
+    def test_prometheus_not_installed(self):
+        with patch('djtriggers.metrics.prometheus_client', None), raises(ImproperlyConfigured):
+            PrometheusBackend()
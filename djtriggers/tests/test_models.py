@@ -1,3 +1,4 @@
+from asgiref.sync import async_to_sync
 from datetime import timedelta
 from logging import ERROR, WARNING
 from redis.exceptions import LockError
@@ -10,11 +11,19 @@ from django.utils import timezone
 
 from djtriggers.exceptions import ProcessLaterError
 from djtriggers.loggers.base import TriggerLogger
+from djtriggers.logic import process_triggers
 from djtriggers.models import Trigger
+from djtriggers.retry import ExponentialBackoff
+from djtriggers.signals import trigger_processed
 from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
 
 
 class TriggerTest(TestCase):
+    def test_base_trigger_keeps_type(self):
+        trigger = DummyTriggerFactory()
+        assert Trigger.objects.get(id=trigger.id).trigger_type == 'dummy_trigger'
+
     def test_handle_execution_success(self):
         trigger = DummyTriggerFactory()
         trigger._handle_execution_success()
@@ -22,18 +31,16 @@ class TriggerTest(TestCase):
         assert trigger.date_processed
         assert trigger.successful is True
 
-    @patch('django_statsd.clients.statsd')
-    def test_handle_execution_success_use_statsd(self, mock_statsd):
+    @patch('djtriggers.models.metrics')
+    def test_handle_execution_success_use_statsd(self, mock_metrics):
         trigger = DummyTriggerFactory(process_after=timezone.now())
         trigger._handle_execution_success(use_statsd=True)
 
         assert trigger.date_processed
         assert trigger.successful is True
-        mock_statsd.incr.assert_called_with(
-            'triggers.{trigger_type}.processed'.format(trigger_type=trigger.trigger_type))
-        mock_statsd.timing.assert_called_with(
-            'triggers.{trigger_type}.process_delay_seconds'.format(trigger_type=trigger.trigger_type),
-            (trigger.date_processed - trigger.process_after).total_seconds())
+        mock_metrics.incr.assert_called_once_with(trigger.trigger_type, 'processed')
+        mock_metrics.timing.assert_called_once_with(trigger.trigger_type, 'process_delay_seconds',
+                                                    (trigger.date_processed - trigger.process_after).total_seconds())
 
     def test_handle_execution_failure(self):
         trigger = DummyTriggerFactory()
@@ -127,8 +134,8 @@ class TriggerTest(TestCase):
                                                                                  try_count=exceeded_retries)
             mock_logger.assert_called_once_with(trigger, message, level=ERROR)
 
-    @patch('django_statsd.clients.statsd')
-    def test_handle_execution_failure_use_statsd(self, mock_statsd):
+    @patch('djtriggers.models.metrics')
+    def test_handle_execution_failure_use_statsd(self, mock_metrics):
         exception = Exception()
         trigger = DummyTriggerFactory()
         original_tries = trigger.number_of_tries
@@ -136,7 +143,56 @@ class TriggerTest(TestCase):
 
         assert trigger.number_of_tries == original_tries + 1
         assert trigger.successful is None
-        mock_statsd.incr.assert_called_with('triggers.{trigger_type}.failed'.format(trigger_type=trigger.trigger_type))
+        mock_metrics.incr.assert_called_once_with(trigger.trigger_type, 'failed')
+
+    @override_settings(DJTRIGGERS_RETRY_POLICY=ExponentialBackoff(base_delay=60, jitter=0))
+    def test_handle_execution_failure_backoff(self):
+        trigger = DummyTriggerFactory(number_of_tries=1)
+        trigger._handle_execution_failure(Exception())
+
+        trigger.refresh_from_db()
+        assert trigger.number_of_tries == 2
+        assert timezone.now() + timedelta(seconds=110) < trigger.process_after <= timezone.now() + timedelta(minutes=2)
+        assert trigger.date_processed is None
+
+    def test_handle_execution_failure_retry_right_away(self):
+        trigger = DummyTriggerFactory()
+        trigger._handle_execution_failure(Exception())
+
+        trigger.refresh_from_db()
+        assert trigger.process_after is None
+
+    def test_save_state(self):
+        trigger = DummyTriggerFactory()
+        trigger.source = 'changed'
+        trigger.number_of_tries = 1
+        trigger.save_state()
+
+        trigger.refresh_from_db()
+        assert trigger.source == 'tests'
+        assert trigger.number_of_tries == 1
+
+    def test_save_states(self):
+        triggers = [DummyTriggerFactory(), DummyTriggerFactory()]
+        for trigger in triggers:
+            trigger._handle_execution_success(save=False)
+            trigger.source = 'changed'
+
+        with self.assertNumQueries(1):
+            Trigger.save_states(triggers)
+        for trigger in triggers:
+            trigger.refresh_from_db()
+            assert trigger.successful is True
+            assert trigger.date_processed is not None
+            assert trigger.source == 'tests'
+
+    def test_process_without_save(self):
+        trigger = DummyTriggerFactory()
+        trigger.process(save=False)
+
+        assert trigger.date_processed is not None
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
 
     @patch.object(TriggerLogger, 'log_result')
     def test_process(self, mock_logger):
@@ -171,3 +227,142 @@ class TriggerTest(TestCase):
             trigger.process()
 
         assert not mock_logger.called
+
+
+class TriggerProcessedTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        trigger_processed.connect(self.receiver)
+
+    def tearDown(self):
+        trigger_processed.disconnect(self.receiver)
+
+    def receiver(self, sender, **kwargs):
+        self.calls.append(dict(kwargs, sender=sender))
+
+    def test_process(self):
+        trigger = DummyTriggerFactory(date_received=timezone.now() - timedelta(minutes=1))
+        trigger.process()
+
+        assert len(self.calls) == 1
+        call = self.calls[0]
+        assert call['sender'] is DummyTrigger
+        assert call['trigger'] is trigger
+        assert call['exception'] is None
+        assert call['lag'] >= 60
+        for name in ('lock_wait', 'process_time', 'persist_time'):
+            assert call[name] >= 0
+
+    def test_process_owned_trigger(self):
+        trigger = DummyTriggerFactory()
+        trigger.process(lock=False, save=False)
+
+        assert self.calls[0]['lock_wait'] is None
+        assert self.calls[0]['persist_time'] is None
+        assert self.calls[0]['process_time'] >= 0
+
+    def test_process_exception(self):
+        trigger = DummyTriggerFactory()
+        exception = ValueError()
+        with patch.object(trigger, '_process', side_effect=exception), raises(ValueError):
+            trigger.process()
+
+        assert self.calls[0]['exception'] is exception
+        assert self.calls[0]['persist_time'] >= 0
+
+    @patch('djtriggers.models.throttle', side_effect=ConnectionError)
+    def test_throttle_error(self, mock_throttle):
+        with raises(ConnectionError):
+            DummyTriggerFactory().process(lock=False, save=False)
+
+        assert self.calls[0]['process_time'] is None
+        assert self.calls[0]['persist_time'] is None
+
+    @patch('djtriggers.models.athrottle', side_effect=ConnectionError)
+    def test_athrottle_error(self, mock_throttle):
+        with raises(ConnectionError):
+            async_to_sync(DummyTriggerFactory().aprocess)(lock=False)
+
+        assert self.calls[0]['process_time'] is None
+        assert self.calls[0]['persist_time'] >= 0
+
+    def test_not_processed(self):
+        DummyTriggerFactory(date_processed=timezone.now()).process()
+        with raises(ProcessLaterError):
+            DummyTriggerFactory(process_after=timezone.now() + timedelta(minutes=1)).process()
+
+        assert not self.calls
+
+    def test_aprocess(self):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', async_process):
+            async_to_sync(trigger.aprocess)(lock=False)
+
+        assert self.calls[0]['lock_wait'] is None
+        assert self.calls[0]['process_time'] >= 0
+        assert self.calls[0]['persist_time'] >= 0
+
+    @patch('djtriggers.models.metrics')
+    def test_use_statsd(self, mock_metrics):
+        trigger = DummyTriggerFactory(process_after=timezone.now())
+        trigger.process(use_statsd=True, lock=False)
+
+        timed = [c[0][1] for c in mock_metrics.timing.call_args_list]
+        assert sorted(timed) == ['lag_seconds', 'persist_time_seconds', 'process_delay_seconds',
+                                 'process_time_seconds']
+
+
+async def async_process(self, dictionary):
+    return 'async result'
+
+
+class AsyncTriggerTest(TestCase):
+    @patch.object(TriggerLogger, 'log_result')
+    def test_aprocess(self, mock_logger):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', async_process):
+            async_to_sync(trigger.aprocess)()
+
+        mock_logger.assert_called_with(trigger, 'async result')
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+        assert trigger.successful is True
+
+    @patch.object(TriggerLogger, 'log_result')
+    def test_process_async_process(self, mock_logger):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', async_process):
+            trigger.process()
+
+        mock_logger.assert_called_with(trigger, 'async result')
+        trigger.refresh_from_db()
+        assert trigger.successful is True
+
+    @patch.object(TriggerLogger, 'log_result')
+    def test_process_triggers_async_process(self, mock_logger):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', async_process):
+            process_triggers()
+
+        mock_logger.assert_called_with(trigger, 'async result')
+
+    def test_aprocess_sync_process(self):
+        trigger = DummyTriggerFactory()
+        async_to_sync(trigger.aprocess)()
+
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+
+    def test_aprocess_process_later(self):
+        trigger = DummyTriggerFactory(process_after=timezone.now() + timedelta(minutes=1))
+        with raises(ProcessLaterError):
+            async_to_sync(trigger.aprocess)()
+
+    def test_aprocess_exception_during_execution(self):
+        trigger = DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', side_effect=Exception), raises(Exception):
+            async_to_sync(trigger.aprocess)()
+
+        trigger.refresh_from_db()
+        assert trigger.number_of_tries == 1
+        assert trigger.date_processed is None
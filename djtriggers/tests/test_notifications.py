@@ -0,0 +1,112 @@
+from django.core.exceptions import ImproperlyConfigured
+from fakeredis import FakeRedis
+from mock import Mock, patch
+from pytest import raises
+
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers.notifications import RedisListener, get_listener, get_notify_backend, notify_triggers
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.worker import TriggerWorker
+
+
+@override_settings(DJTRIGGERS_NOTIFY_BACKEND='redis')
+class RedisNotificationsTest(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('djtriggers.notifications.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.listener = get_listener()
+        self.addCleanup(self.listener.close)
+
+    def test_listener(self):
+        assert isinstance(self.listener, RedisListener)
+        assert not self.listener.wait(0.01)
+
+    def test_notify_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify_triggers()
+            assert not self.listener.wait(0.01)
+        for callback in callbacks:
+            callback()
+        assert self.listener.wait(0.01)
+        assert not self.listener.wait(0.01)
+
+    def test_notify_when_created(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DummyTriggerFactory()
+            DummyTriggerFactory()
+        assert self.listener.wait(0.01)
+        # Pending notifications are handled at once
+        assert not self.listener.wait(0.01)
+
+    def test_dont_notify_when_updated(self):
+        trigger = DummyTriggerFactory()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            trigger.process()
+        assert not callbacks
+
+    def test_redis_error(self):
+        with patch.object(self.redis, 'publish', side_effect=ConnectionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            DummyTriggerFactory()
+        assert not self.listener.wait(0.01)
+
+
+class NotifyBackendTest(TestCase):
+    def test_disabled(self):
+        assert get_notify_backend() is None
+        assert get_listener() is None
+        with self.captureOnCommitCallbacks() as callbacks:
+            DummyTriggerFactory()
+        assert not callbacks
+
+    @override_settings(DJTRIGGERS_NOTIFY_BACKEND='unknown')
+    def test_unknown(self):
+        with raises(ImproperlyConfigured):
+            get_notify_backend()
+
+
+class WorkerSleepTest(TestCase):
+    def test_wake_up_on_notification(self):
+        worker = TriggerWorker()
+        worker.listener = Mock(**{'wait.side_effect': [False, True]})
+        worker.sleep(5)
+        assert worker.listener.wait.call_count == 2
+        assert worker.listener.wait.call_args[0][0] <= 1
+
+    def test_stop_while_listening(self):
+        worker = TriggerWorker()
+        worker.listener = Mock(**{'wait.side_effect': lambda timeout: worker.stop()})
+        worker.sleep(5)
+        assert worker.listener.wait.call_count == 1
+
+    def test_fall_back_to_polling(self):
+        worker = TriggerWorker(max_sleep=30)
+        listener = worker.listener = Mock(**{'wait.side_effect': ConnectionError})
+        with patch.object(worker._stopping, 'wait') as mock_wait:
+            worker.sleep(5)
+
+        assert listener.close.called
+        assert worker.listener is None
+        assert 4 < mock_wait.call_args[0][0] <= 5
+
+        # Listen again once max_sleep has passed
+        with patch('djtriggers.worker.get_listener') as mock_get_listener, \
+                patch.object(worker._stopping, 'wait'):
+            worker.sleep(0)
+            assert not mock_get_listener.called
+            worker._reconnect_at = 0
+            worker.sleep(0)
+        assert worker.listener is mock_get_listener.return_value
+
+    @override_settings(DJTRIGGERS_NOTIFY_BACKEND='redis')
+    def test_run_without_redis(self):
+        worker = TriggerWorker()
+        with patch('djtriggers.worker.get_listener', side_effect=ConnectionError), \
+                patch.object(worker, 'run_once', side_effect=worker.stop):
+            worker.run()
+        assert worker.listener is None
+        assert worker._reconnect_at is not None
@@ -0,0 +1,154 @@
+from mock import patch
+
+from django.db import models
+from django.test.testcases import TestCase
+from django.test.utils import isolate_apps
+
+from djtriggers.models import Trigger, TriggerResult
+from djtriggers.registry import TriggerRegistry, _register_trigger_model, registry
+from djtriggers.tests.models import DummyTrigger, OtherDummyTrigger
+
+
+class TriggerRegistryTest(TestCase):
+    def test_get_model(self):
+        assert registry.get_model('dummy_trigger') is DummyTrigger
+        assert registry.get_model('other_dummy_trigger') is OtherDummyTrigger
+        assert registry.get_model('unknown_trigger') is None
+
+    def test_get_model_by_name(self):
+        assert registry.get_model_by_name('djtriggers', 'DummyTrigger') is DummyTrigger
+        assert registry.get_model_by_name('djtriggers', 'Trigger') is None
+
+    def test_get_types(self):
+        assert 'dummy_trigger' in registry.get_types()
+        assert 'dummy_trigger' in registry
+        assert 'unknown_trigger' not in registry
+        assert DummyTrigger in registry.get_models()
+
+    def test_register_ignores_untyped_models(self):
+        trigger_registry = TriggerRegistry()
+        trigger_registry.register(Trigger)
+        trigger_registry.register(TriggerResult)
+        trigger_registry.register(DummyTrigger)
+        assert trigger_registry._models == {'dummy_trigger': DummyTrigger}
+
+    def test_register_inherited_type(self):
+        class InheritedDummyTrigger(DummyTrigger):
+            class Meta:
+                proxy = True
+
+        assert registry.get_model('dummy_trigger') is DummyTrigger
+
+    @isolate_apps('djtriggers')
+    def test_skip_isolated_models(self):
+        class IsolatedTrigger(DummyTrigger):
+            typed = 'isolated_trigger'
+
+            class Meta:
+                proxy = True
+
+        assert 'isolated_trigger' not in registry
+
+    def test_skip_models_of_apps_not_installed(self):
+        with isolate_apps('djtriggers') as isolated_apps:
+            class InstalledTrigger(DummyTrigger):
+                typed = 'installed_trigger'
+
+                class Meta:
+                    proxy = True
+
+            class NotInstalledTrigger(DummyTrigger):
+                typed = 'not_installed_trigger'
+
+                class Meta:
+                    app_label = 'not_installed'
+                    proxy = True
+
+        # As if the isolated apps were the installed ones
+        trigger_registry = TriggerRegistry()
+        with patch('djtriggers.registry.apps', isolated_apps), \
+                patch('djtriggers.registry.registry', trigger_registry):
+            _register_trigger_model(InstalledTrigger)
+            _register_trigger_model(NotInstalledTrigger)
+        assert trigger_registry._models == {'installed_trigger': InstalledTrigger}
+
+    def test_get_tables_proxy(self):
+        # Only the tables that refer to the main trigger table
+        assert registry.get_tables('dummy_trigger') == [('djtriggers_triggerresult', 'trigger_id')]
+        assert registry.get_tables('unknown_trigger') == [('djtriggers_triggerresult', 'trigger_id')]
+        assert not registry.needs_orm_delete('dummy_trigger')
+
+    @isolate_apps('djtriggers')
+    def test_get_tables_multi_table_inheritance(self):
+        class ParentTrigger(Trigger):
+            parent_data = models.IntegerField()
+
+        class ChildTrigger(ParentTrigger):
+            child_data = models.IntegerField()
+
+            class Meta:
+                db_table = 'child_trigger'
+
+        class ProxyChildTrigger(ChildTrigger):
+            class Meta:
+                proxy = True
+
+        # Set the type afterwards, so the models don't end up in the global registry
+        ParentTrigger.typed = 'parent_trigger'
+        ProxyChildTrigger.typed = 'proxy_child_trigger'
+        trigger_registry = TriggerRegistry()
+        trigger_registry.register(ParentTrigger)
+        trigger_registry.register(ProxyChildTrigger)
+
+        assert trigger_registry.get_tables('parent_trigger') == [
+            ('djtriggers_parenttrigger', 'trigger_ptr_id'),
+            ('djtriggers_triggerresult', 'trigger_id'),
+        ]
+        assert trigger_registry.get_tables('proxy_child_trigger') == [
+            ('child_trigger', 'parenttrigger_ptr_id'),
+            ('djtriggers_parenttrigger', 'trigger_ptr_id'),
+            ('djtriggers_triggerresult', 'trigger_id'),
+        ]
+
+    @isolate_apps('djtriggers')
+    def test_get_tables_relations(self):
+        class RelatedTrigger(Trigger):
+            tags = models.ManyToManyField('Tag')
+
+        class Tag(models.Model):
+            pass
+
+        class Attachment(models.Model):
+            trigger = models.ForeignKey(RelatedTrigger, on_delete=models.CASCADE)
+
+        RelatedTrigger.typed = 'related_trigger'
+        trigger_registry = TriggerRegistry()
+        trigger_registry.register(RelatedTrigger)
+
+        assert trigger_registry.get_tables('related_trigger') == [
+            ('djtriggers_attachment', 'trigger_id'),
+            ('djtriggers_relatedtrigger_tags', 'relatedtrigger_id'),
+            ('djtriggers_relatedtrigger', 'trigger_ptr_id'),
+            ('djtriggers_triggerresult', 'trigger_id'),
+        ]
+        assert not trigger_registry.needs_orm_delete('related_trigger')
+
+    @isolate_apps('djtriggers')
+    def test_needs_orm_delete(self):
+        class RelatedTrigger(Trigger):
+            pass
+
+        class Attachment(models.Model):
+            trigger = models.ForeignKey(RelatedTrigger, null=True, on_delete=models.SET_NULL)
+
+        class CascadingAttachment(models.Model):
+            trigger = models.ForeignKey(RelatedTrigger, on_delete=models.CASCADE)
+
+        class Comment(models.Model):
+            attachment = models.ForeignKey(CascadingAttachment, on_delete=models.CASCADE)
+
+        RelatedTrigger.typed = 'related_trigger'
+        trigger_registry = TriggerRegistry()
+        trigger_registry.register(RelatedTrigger)
+
+        assert trigger_registry.needs_orm_delete('related_trigger')
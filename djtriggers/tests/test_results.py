@@ -0,0 +1,105 @@
+from datetime import date
+from zlib import compress
+
+from mock import patch
+from pytest import raises
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers.loggers.database import BufferedDatabaseSerializeLogger, DatabaseSerializeLogger
+from djtriggers.models import TriggerResult
+from djtriggers.results import compact_trigger_results, encode_result
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+
+
+class EncodeResultTest(TestCase):
+    def test_text(self):
+        assert encode_result('result') == ('', 'result', None)
+        assert encode_result(12) == ('', '12', None)
+
+    def test_json(self):
+        assert encode_result({'ids': [1, 2]}, 'json') == ('json', '{"ids": [1, 2]}', None)
+
+    def test_json_iterables(self):
+        assert encode_result({'ids': (i for i in range(2)), 'at': date(2020, 1, 1)}, 'json')[1] == \
+            '{"ids": [0, 1], "at": "2020-01-01"}'
+
+    def test_zlib(self):
+        assert encode_result('result', 'zlib') == ('zlib', '', compress(b'result'))
+
+    @override_settings(DJTRIGGERS_RESULT_ENCODING='zstd')
+    def test_zstd_not_installed(self):
+        with patch('djtriggers.results.zstandard', None), raises(ImproperlyConfigured):
+            encode_result('result')
+
+    @override_settings(DJTRIGGERS_RESULT_ENCODING='bz2')
+    def test_unknown_encoding(self):
+        with raises(ImproperlyConfigured):
+            encode_result('result')
+
+    @override_settings(DJTRIGGERS_RESULT_MAX_SIZE=5)
+    def test_truncate(self):
+        assert encode_result('result')[1] == 'resul\n[truncated 1 characters]'
+        assert encode_result('short')[1] == 'short'
+        # Truncated JSON is stored as a string
+        assert encode_result([1, 2, 3], 'json')[1] == '"[1, 2\\n[truncated 4 characters]"'
+
+
+class TriggerResultTest(TestCase):
+    def setUp(self):
+        self.trigger = DummyTriggerFactory()
+
+    def test_value(self):
+        for encoding, value in (('', 'done'), ('json', ['done', 1]), ('zlib', 'done' * 100)):
+            result = TriggerResult.from_result(self.trigger, value, encoding)
+            result.save()
+            assert TriggerResult.objects.get(id=result.id).value == value
+
+    def test_legacy_result(self):
+        result = TriggerResult.objects.create(trigger=self.trigger, result='done')
+        assert result.value == 'done'
+        assert repr(result) == 'done'
+
+    @override_settings(DJTRIGGERS_RESULT_ENCODING='json')
+    def test_serialize_loggers(self):
+        DatabaseSerializeLogger().log_result(self.trigger, [1, 2])
+        with patch('djtriggers.loggers.database.register'):
+            logger = BufferedDatabaseSerializeLogger()
+        logger.log_result(self.trigger, {'a': 1})
+        logger.flush()
+        assert [r.value for r in TriggerResult.objects.order_by('id')] == [[1, 2], {'a': 1}]
+
+    @override_settings(DJTRIGGERS_RESULT_ENCODING='json')
+    def test_serialize_generator(self):
+        with patch('djtriggers.loggers.database.register'):
+            logger = BufferedDatabaseSerializeLogger()
+        logger.log_result(self.trigger, (i for i in range(3)))
+        logger.flush()
+        assert TriggerResult.objects.get().value == [0, 1, 2]
+
+
+class CompactTriggerResultsTest(TestCase):
+    def test_compact(self):
+        trigger = DummyTriggerFactory()
+        for i in range(3):
+            TriggerResult.objects.create(trigger=trigger, result='result {}'.format(i))
+        TriggerResult.from_result(trigger, [3], 'json').save()
+
+        with override_settings(DJTRIGGERS_RESULT_ENCODING='zlib'):
+            assert compact_trigger_results(batch_size=2) == 3
+        results = TriggerResult.objects.order_by('id')
+        assert [r.encoding for r in results] == ['zlib', 'zlib', 'zlib', 'json']
+        assert [r.value for r in results] == ['result 0', 'result 1', 'result 2', [3]]
+        assert compact_trigger_results('zlib') == 0
+
+    def test_nothing_to_do_without_encoding(self):
+        TriggerResult.objects.create(trigger=DummyTriggerFactory(), result='result')
+        assert compact_trigger_results() == 0
+
+    def test_command(self):
+        TriggerResult.objects.create(trigger=DummyTriggerFactory(), result='result')
+        call_command('compact_trigger_results', encoding='json')
+        assert TriggerResult.objects.get().value == 'result'
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from mock import patch
+
+from django.test import override_settings
+from django.test.testcases import TestCase
+
+from djtriggers.retry import ExponentialBackoff, LinearBackoff, RetryPolicy, get_retry_policy
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+
+
+class RetryPolicyTest(TestCase):
+    def test_retry_right_away(self):
+        assert RetryPolicy().get_delay(1) is None
+
+    def test_exponential_backoff(self):
+        policy = ExponentialBackoff(base_delay=10, factor=3, max_delay=100, jitter=0)
+        assert [policy.get_delay(tries).total_seconds() for tries in (1, 2, 3, 4, 1000)] == [10, 30, 90, 100, 100]
+
+    def test_linear_backoff(self):
+        policy = LinearBackoff(delay=40, max_delay=100, jitter=0)
+        assert [policy.get_delay(tries).total_seconds() for tries in (1, 2, 3)] == [40, 80, 100]
+
+    def test_jitter(self):
+        policy = LinearBackoff(delay=100, jitter=0.5)
+        with patch('djtriggers.retry.random', return_value=0.5):
+            assert policy.get_delay(1) == timedelta(seconds=75)
+        delays = {policy.get_delay(1) for _ in range(20)}
+        assert len(delays) > 1
+        assert all(timedelta(seconds=50) <= delay <= timedelta(seconds=100) for delay in delays)
+
+    def test_get_retry_policy(self):
+        trigger = DummyTriggerFactory()
+        assert type(get_retry_policy(trigger)) is RetryPolicy
+
+        policy = ExponentialBackoff()
+        with override_settings(DJTRIGGERS_RETRY_POLICY=policy):
+            assert get_retry_policy(trigger) is policy
+
+            type_policy = LinearBackoff()
+            with patch.object(DummyTrigger, 'retry_policy', type_policy):
+                assert get_retry_policy(trigger) is type_policy
@@ -0,0 +1,42 @@
+from mock import patch
+
+from django.test.testcases import TestCase
+
+from djtriggers.tasks import process_trigger, process_trigger_batch
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+
+
+class ProcessTriggerTaskTest(TestCase):
+    def test_process_trigger(self):
+        trigger = DummyTriggerFactory()
+        process_trigger(trigger.id, 'djtriggers', 'DummyTrigger', use_statsd=False)
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+
+    @patch('djtriggers.tasks.metrics')
+    def test_process_trigger_flushes_metrics(self, mock_metrics):
+        trigger = DummyTriggerFactory()
+        process_trigger(trigger.id, 'djtriggers', 'DummyTrigger', use_statsd=True)
+        assert mock_metrics.flush.called
+
+    def test_process_trigger_deleted(self):
+        trigger = DummyTriggerFactory()
+        trigger.delete()
+        with patch.object(DummyTrigger, 'process') as mock_process:
+            process_trigger(trigger.id, 'djtriggers', 'DummyTrigger')
+        assert not mock_process.called
+
+    def test_process_trigger_unknown_model(self):
+        trigger = DummyTriggerFactory()
+        process_trigger(trigger.id, 'djtriggers', 'TriggerResult')
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
+
+
+class ProcessTriggerBatchTaskTest(TestCase):
+    def test_process_trigger_batch(self):
+        trigger = DummyTriggerFactory()
+        process_trigger_batch('dummy_trigger', [trigger.id], use_statsd=False)
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
@@ -0,0 +1,123 @@
+from asgiref.sync import async_to_sync
+from contextlib import nullcontext
+from datetime import timedelta
+
+from fakeredis import FakeRedis
+from mock import patch
+from pytest import raises
+
+from django.test import override_settings
+from django.test.testcases import TestCase
+from django.utils import timezone
+
+from djtriggers.exceptions import ProcessLaterError
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+from djtriggers.throttling import LocalThrottle, acquire, release, throttle
+
+
+class ThrottleTestMixin(object):
+    def test_no_limits(self):
+        trigger = DummyTriggerFactory()
+        assert acquire(trigger) is None
+        release(trigger, None)
+
+    @patch.object(DummyTrigger, 'max_concurrency', 2)
+    def test_max_concurrency(self):
+        trigger = DummyTriggerFactory()
+        first = acquire(trigger)
+        second = acquire(trigger)
+        with raises(ProcessLaterError) as exc_info:
+            acquire(trigger)
+        assert timezone.now() < exc_info.value.process_after <= timezone.now() + timedelta(seconds=1)
+
+        release(trigger, first)
+        third = acquire(trigger)
+        release(trigger, second)
+        release(trigger, third)
+
+    @override_settings(DJTRIGGERS_THROTTLE_LEASE_SECONDS=10)
+    @patch.object(DummyTrigger, 'max_concurrency', 1)
+    def test_slot_lease(self):
+        trigger = DummyTriggerFactory()
+        with patch('djtriggers.throttling.time', return_value=1000):
+            acquire(trigger)
+        with patch('djtriggers.throttling.time', return_value=1009), raises(ProcessLaterError):
+            acquire(trigger)
+        with patch('djtriggers.throttling.time', return_value=1011):
+            acquire(trigger)
+
+    @patch.object(DummyTrigger, 'rate_limit', 2)
+    def test_rate_limit(self):
+        trigger = DummyTriggerFactory()
+        with patch('djtriggers.throttling.time', return_value=1000):
+            assert acquire(trigger) is None
+            assert acquire(trigger) is None
+            with raises(ProcessLaterError) as exc_info:
+                acquire(trigger)
+        # A new token every half second
+        wait = exc_info.value.process_after - timezone.now()
+        assert timedelta(seconds=0.4) < wait <= timedelta(seconds=0.5)
+        with patch('djtriggers.throttling.time', return_value=1000.5):
+            acquire(trigger)
+            with raises(ProcessLaterError):
+                acquire(trigger)
+
+    @patch.object(DummyTrigger, 'max_concurrency', 1)
+    @patch.object(DummyTrigger, 'rate_limit', 1)
+    def test_throttled_slot_is_not_taken(self):
+        trigger = DummyTriggerFactory()
+        with patch('djtriggers.throttling.time', return_value=1000):
+            release(trigger, acquire(trigger))
+            with raises(ProcessLaterError):
+                acquire(trigger)
+        with patch('djtriggers.throttling.time', return_value=1001):
+            acquire(trigger)
+
+    @patch.object(DummyTrigger, 'max_concurrency', 1)
+    def test_defer_processing(self):
+        trigger = DummyTriggerFactory()
+        other_trigger = DummyTriggerFactory()
+        with throttle(trigger):
+            other_trigger.process()
+        other_trigger.refresh_from_db()
+        assert other_trigger.date_processed is None
+        assert other_trigger.process_after is not None
+        assert other_trigger.number_of_tries == 0
+
+        # The slot is released after processing
+        trigger.process()
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+        other_trigger.process(force=True)
+        assert other_trigger.date_processed is not None
+
+    @patch.object(DummyTrigger, 'max_concurrency', 1)
+    def test_defer_async_processing(self):
+        trigger = DummyTriggerFactory()
+        with throttle(DummyTriggerFactory()):
+            async_to_sync(trigger.aprocess)()
+        trigger.refresh_from_db()
+        assert trigger.date_processed is None
+        assert trigger.process_after is not None
+
+
+class LocalThrottleTest(ThrottleTestMixin, TestCase):
+    def setUp(self):
+        patcher = patch('djtriggers.throttling.local_throttle', LocalThrottle())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(DJTRIGGERS_REDIS_URL='redis://localhost:6379/0')
+class RedisThrottleTest(ThrottleTestMixin, TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('djtriggers.throttling.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Processing itself isn't locked in these tests
+        for name in ('redis_lock', 'aredis_lock'):
+            patcher = patch('djtriggers.models.' + name, return_value=nullcontext())
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,134 @@
+from datetime import timedelta
+from signal import SIGTERM, getsignal
+
+from mock import patch
+from pytest import raises
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.testcases import TestCase
+from django.utils import timezone
+
+from djtriggers.logic import process_triggers
+from djtriggers.models import Trigger
+from djtriggers.tests.factories.triggers import DummyTriggerFactory
+from djtriggers.tests.models import DummyTrigger
+from djtriggers.worker import TriggerWorker, get_next_process_after
+
+
+class ProcessTriggersCountTest(TestCase):
+    def test_count(self):
+        for _ in range(3):
+            DummyTriggerFactory()
+        DummyTriggerFactory(process_after=timezone.now() + timedelta(days=1))
+        assert process_triggers() == 3
+
+    def test_max_count(self):
+        for _ in range(3):
+            DummyTriggerFactory()
+        assert process_triggers(max_count=2) == 2
+        assert Trigger.objects.filter(date_processed__isnull=True).count() == 1
+
+    @override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True, DJTRIGGERS_CLAIM_BATCH_SIZE=2)
+    def test_count_claimed(self):
+        for _ in range(3):
+            DummyTriggerFactory()
+        assert process_triggers() == 3
+
+    def test_keep_going_after_error(self):
+        triggers = [DummyTriggerFactory() for _ in range(3)]
+        with patch.object(DummyTrigger, '_process', side_effect=[ValueError, None, None]), raises(ValueError):
+            process_triggers()
+        assert Trigger.objects.filter(id__in=[t.id for t in triggers], successful=True).count() == 2
+
+    @override_settings(DJTRIGGERS_CLAIM_TRIGGERS=True, DJTRIGGERS_CLAIM_BATCH_SIZE=2)
+    def test_count_without_raising(self):
+        for _ in range(4):
+            DummyTriggerFactory()
+        with patch.object(DummyTrigger, '_process', side_effect=[ValueError, None, ValueError, None]):
+            assert process_triggers(raise_errors=False) == 4
+        assert Trigger.objects.filter(successful=True).count() == 2
+
+
+class TriggerWorkerTest(TestCase):
+    def setUp(self):
+        self.worker = TriggerWorker(batch_size=10, min_sleep=1, max_sleep=8)
+
+    def test_next_process_after(self):
+        assert get_next_process_after() is None
+
+        process_after = timezone.now() + timedelta(minutes=1)
+        DummyTriggerFactory(process_after=process_after)
+        DummyTriggerFactory(process_after=process_after + timedelta(minutes=1))
+        DummyTriggerFactory(process_after=process_after - timedelta(minutes=2))
+        DummyTriggerFactory(process_after=process_after - timedelta(seconds=30), date_processed=timezone.now())
+        assert get_next_process_after() == process_after
+
+    def test_sleep_busy(self):
+        assert self.worker.get_sleep(10) == 0
+        assert self.worker.get_sleep(3) == 1
+
+    def test_sleep_idle_backoff(self):
+        assert [self.worker.get_sleep(0) for _ in range(5)] == [1, 2, 4, 8, 8]
+        self.worker.get_sleep(1)
+        assert self.worker.get_sleep(0) == 1
+
+    def test_sleep_until_next_trigger(self):
+        self.worker.idle_sleep = 8
+        DummyTriggerFactory(process_after=timezone.now() + timedelta(seconds=3))
+        assert 2 < self.worker.get_sleep(0) <= 3
+
+    def test_run_once(self):
+        trigger = DummyTriggerFactory()
+        with patch.object(self.worker._stopping, 'wait') as mock_wait:
+            assert self.worker.run_once() == 1
+
+        trigger.refresh_from_db()
+        assert trigger.date_processed is not None
+        mock_wait.assert_called_with(1)
+
+    def test_run_once_error(self):
+        self.worker.idle_sleep = 4
+        with patch('djtriggers.worker.process_triggers', side_effect=ValueError), \
+                patch.object(self.worker._stopping, 'wait') as mock_wait:
+            assert self.worker.run_once() == 0
+        # No backing off after an error
+        mock_wait.assert_called_once_with(1)
+        assert self.worker.idle_sleep == 1
+
+    def test_run_once_failing_triggers(self):
+        for _ in range(12):
+            DummyTriggerFactory()
+        # Every third trigger fails
+        with patch.object(DummyTrigger, '_process', side_effect=[ValueError, None, None] * 4), \
+                patch.object(self.worker._stopping, 'wait') as mock_wait:
+            assert self.worker.run_once() == 10
+        # The batch was full, so the worker polls again right away
+        mock_wait.assert_called_once_with(0)
+        assert Trigger.objects.filter(successful=True).count() == 6
+
+    def test_run_until_stopped(self):
+        def process(**kwargs):
+            # SIGTERM is handled by the worker while it runs
+            getsignal(SIGTERM)(SIGTERM, None)
+            return 10
+
+        previous_handler = getsignal(SIGTERM)
+        with patch('djtriggers.worker.process_triggers', side_effect=process) as mock_process:
+            self.worker.run()
+
+        assert mock_process.call_count == 1
+        assert self.worker.stopping
+        assert getsignal(SIGTERM) == previous_handler
+
+    @override_settings(DJTRIGGERS_ASYNC_HANDLING=True)
+    def test_run_async_without_claiming(self):
+        with patch('djtriggers.worker.process_triggers') as mock_process, raises(ImproperlyConfigured):
+            self.worker.run()
+        assert not mock_process.called
+
+    def test_command(self):
+        with patch.object(TriggerWorker, 'run') as mock_run:
+            call_command('run_trigger_worker', '--batch-size', '5', '--max-sleep', '2')
+        assert mock_run.called
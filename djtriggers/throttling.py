@@ -0,0 +1,163 @@
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from math import ceil
+from threading import Lock
+from time import time
+from uuid import uuid1
+
+from django.conf import settings
+from django.utils import timezone
+
+from .exceptions import ProcessLaterError
+from .locking import get_redis
+
+# Takes a concurrency slot (a member of the sorted set KEYS[1], scored by its expiry) and a token of the rate limit
+# bucket (the hash KEYS[2]), or neither. ARGV is the slot token, the current time, the maximum concurrency (or ''),
+# the lease of the slot in seconds, the rate limit per second (or '') and the bucket size.
+# Returns {1, '0'} when allowed, and {0, seconds to wait} when throttled (-1 when waiting for a free slot).
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('zremrangebyscore', KEYS[1], '-inf', now)
+    if redis.call('zcard', KEYS[1]) >= tonumber(ARGV[3]) then
+        return {0, '-1'}
+    end
+end
+if ARGV[5] ~= '' then
+    local rate = tonumber(ARGV[5])
+    local burst = tonumber(ARGV[6])
+    local bucket = redis.call('hmget', KEYS[2], 'tokens', 'time')
+    local tokens = tonumber(bucket[1]) or burst
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+    if tokens < 1 then
+        return {0, tostring((1 - tokens) / rate)}
+    end
+    redis.call('hset', KEYS[2], 'tokens', tostring(tokens - 1), 'time', tostring(now))
+    redis.call('expire', KEYS[2], math.ceil(burst / rate) + 1)
+end
+if ARGV[3] ~= '' then
+    redis.call('zadd', KEYS[1], now + tonumber(ARGV[4]), ARGV[1])
+    redis.call('expire', KEYS[1], ARGV[4])
+end
+return {1, '0'}
+"""
+
+
+class LocalThrottle(object):
+    """
+    The limits of a single process, used when there's no Redis (e.g. in tests).
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.slots = {}
+        self.buckets = {}
+
+    def acquire(self, key, token, now, max_concurrency, lease, rate_limit, burst):
+        """
+        Same as ACQUIRE_SCRIPT.
+
+        :return: None when allowed, otherwise the number of seconds to wait (-1 when waiting for a free slot)
+        """
+        with self.lock:
+            slots = self.slots.setdefault(key, {})
+            if max_concurrency is not None:
+                for expired in [t for t, expiry in slots.items() if expiry <= now]:
+                    del slots[expired]
+                if len(slots) >= max_concurrency:
+                    return -1
+            if rate_limit is not None:
+                tokens, last = self.buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + max(0, now - last) * rate_limit)
+                if tokens < 1:
+                    return (1 - tokens) / rate_limit
+                self.buckets[key] = (tokens - 1, now)
+            if max_concurrency is not None:
+                slots[token] = now + lease
+            return None
+
+    def release(self, key, token):
+        with self.lock:
+            self.slots.get(key, {}).pop(token, None)
+
+
+local_throttle = LocalThrottle()
+
+
+def acquire(trigger):
+    """
+    Check the limits of the type of the trigger before processing it, and take a concurrency slot.
+
+    Relevant settings are:
+     - DJTRIGGERS_THROTTLE_LEASE_SECONDS: how long a concurrency slot is kept when it isn't released (e.g. because
+       the worker died). Defaults to 300.
+     - DJTRIGGERS_THROTTLE_DELAY: how many seconds to defer triggers that wait for a concurrency slot. Defaults to 1.
+
+    :return: the token of the concurrency slot (release it with release()), or None if there's no limit
+    :raises ProcessLaterError: when the trigger has to wait, with a process_after to retry it at
+    """
+    max_concurrency, rate_limit = trigger.max_concurrency, trigger.rate_limit
+    if max_concurrency is None and rate_limit is None:
+        return None
+
+    key = 'djtriggers-throttle-{}'.format(trigger.trigger_type)
+    token = uuid1().hex
+    lease = int(getattr(settings, 'DJTRIGGERS_THROTTLE_LEASE_SECONDS', 300))
+    burst = max(1, rate_limit or 0)
+    now = time()
+    if settings.DJTRIGGERS_REDIS_URL.startswith('redis'):
+        allowed, wait = get_redis().register_script(ACQUIRE_SCRIPT)(
+            keys=[key + '-concurrency', key + '-rate'],
+            args=[token, repr(now), '' if max_concurrency is None else max_concurrency, lease,
+                  '' if rate_limit is None else repr(float(rate_limit)), repr(float(burst))])
+        wait = None if allowed else float(wait)
+    else:
+        wait = local_throttle.acquire(key, token, now, max_concurrency, lease, rate_limit, burst)
+
+    if wait is not None:
+        if wait < 0:
+            wait = getattr(settings, 'DJTRIGGERS_THROTTLE_DELAY', 1)
+        raise ProcessLaterError(timezone.now() + timedelta(seconds=ceil(wait * 1000) / 1000))
+    return token if max_concurrency is not None else None
+
+
+def release(trigger, token):
+    """
+    Release a concurrency slot taken with acquire().
+    """
+    if token is None:
+        return
+
+    key = 'djtriggers-throttle-{}'.format(trigger.trigger_type)
+    if settings.DJTRIGGERS_REDIS_URL.startswith('redis'):
+        get_redis().zrem(key + '-concurrency', token)
+    else:
+        local_throttle.release(key, token)
+
+
+@contextmanager
+def throttle(trigger):
+    """
+    Process a trigger within the concurrency and rate limits of its type (see Trigger.max_concurrency and
+    Trigger.rate_limit), which are shared by all workers through DJTRIGGERS_REDIS_URL.
+
+    :raises ProcessLaterError: when the trigger has to wait
+    """
+    token = acquire(trigger)
+    try:
+        yield
+    finally:
+        release(trigger, token)
+
+
+@asynccontextmanager
+async def athrottle(trigger):
+    """
+    The asyncio version of throttle().
+    """
+    token = await sync_to_async(acquire)(trigger)
+    try:
+        yield
+    finally:
+        await sync_to_async(release)(trigger, token)
@@ -0,0 +1,219 @@
+from logging import getLogger
+from signal import SIGINT, SIGTERM, getsignal, signal
+from threading import Event, current_thread, main_thread
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from .executors import get_executor
+from .logic import _get_batch_size, process_triggers
+from .models import Trigger
+from .notifications import get_listener, get_notify_backend
+
+
+logger = getLogger(__name__)
+
+
+def get_next_process_after():
+    """
+    Get the earliest process_after of the unprocessed triggers that aren't due yet.
+
+    :rtype: datetime or None
+    """
+    return Trigger.objects.filter(date_processed__isnull=True, process_after__gt=timezone.now()) \
+        .aggregate(next_process_after=Min('process_after'))['next_process_after']
+
+
+class TriggerWorker(object):
+    """
+    Processes triggers in a loop until it's stopped, so triggers are processed soon after they become due instead of
+    at the next run of the process_triggers command or task.
+
+    Every iteration handles at most one batch of due triggers. When the batch was full, the worker polls again right
+    away. Otherwise it sleeps until the next trigger becomes due, and backs off (doubling the sleep up to `max_sleep`)
+    as long as it finds nothing to do.
+
+    With DJTRIGGERS_NOTIFY_BACKEND, the worker also wakes up as soon as a trigger is created (see
+    djtriggers.notifications), so polling is only a safety net and `max_sleep` can be a lot longer.
+
+    SIGTERM and SIGINT stop the worker once it's done with its current batch.
+    """
+    def __init__(self, use_statsd=False, executor=None, max_workers=None, batch_size=None, min_sleep=None,
+                 max_sleep=None):
+        """
+        :param bool use_statsd: whether to use statsd
+        :param str executor: how to process triggers synchronously, see djtriggers.executors.get_executor()
+        :param int max_workers: the maximum number of triggers processed concurrently by a thread or process pool
+        :param int batch_size: the maximum number of triggers handled per iteration. Defaults to
+            DJTRIGGERS_WORKER_BATCH_SIZE, or DJTRIGGERS_BATCH_SIZE.
+        :param float min_sleep: how many seconds to sleep after a batch that wasn't full. Defaults to
+            DJTRIGGERS_WORKER_MIN_SLEEP, or 0.5.
+        :param float max_sleep: the maximum number of seconds to sleep. Defaults to DJTRIGGERS_WORKER_MAX_SLEEP, or 30.
+        """
+        self.use_statsd = use_statsd
+        self.executor = executor
+        self.max_workers = max_workers
+        self.batch_size = batch_size or getattr(settings, 'DJTRIGGERS_WORKER_BATCH_SIZE', None) or _get_batch_size()
+        self.min_sleep = min_sleep if min_sleep is not None else getattr(settings, 'DJTRIGGERS_WORKER_MIN_SLEEP', 0.5)
+        self.max_sleep = max_sleep if max_sleep is not None else getattr(settings, 'DJTRIGGERS_WORKER_MAX_SLEEP', 30)
+        self.idle_sleep = self.min_sleep
+        self.listener = None
+        # When to try listening for notifications again, after it failed
+        self._reconnect_at = None
+        self._stopping = Event()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def stop(self, *args):
+        """
+        Stop the worker once it's done with its current batch. This is also the signal handler.
+        """
+        if not self.stopping:
+            logger.info('Stopping the trigger worker after the current batch')
+        self._stopping.set()
+
+    def run(self):
+        """
+        Process triggers until the worker is stopped.
+        """
+        # Due triggers would be sent to Celery over and over again until a task has processed them
+        if getattr(settings, 'DJTRIGGERS_ASYNC_HANDLING', False) and \
+                not getattr(settings, 'DJTRIGGERS_CLAIM_TRIGGERS', False):
+            raise ImproperlyConfigured('The trigger worker needs DJTRIGGERS_CLAIM_TRIGGERS with '
+                                       'DJTRIGGERS_ASYNC_HANDLING')
+
+        handlers = self._install_signal_handlers()
+        # Fail right away when notifications are misconfigured
+        get_notify_backend()
+        self.connect_listener()
+        try:
+            with get_executor(self.executor, self.max_workers) as executor:
+                logger.info('Started the trigger worker')
+                while not self.stopping:
+                    self.run_once(executor)
+        finally:
+            self.close_listener()
+            for signum, handler in handlers.items():
+                signal(signum, handler)
+        logger.info('Stopped the trigger worker')
+
+    def run_once(self, executor=None):
+        """
+        Handle a batch of due triggers, and sleep until it's time for the next one.
+
+        :return: the number of triggers that were handled
+        :rtype: int
+        """
+        # Like Django does for every request, drop connections that are broken or too old
+        close_old_connections()
+        try:
+            # Triggers that raise don't keep the others from being processed, their errors are logged
+            nr_handled = process_triggers(use_statsd=self.use_statsd, executor=executor or self.executor,
+                                          max_workers=self.max_workers, max_count=self.batch_size,
+                                          raise_errors=False)
+        except Exception:
+            logger.exception('Processing triggers failed')
+            nr_handled = None
+        finally:
+            close_old_connections()
+
+        if not self.stopping:
+            self.sleep(self.get_sleep(nr_handled))
+        return nr_handled or 0
+
+    def connect_listener(self):
+        """
+        Listen for notifications, if they're enabled. When that fails (e.g. because Redis is down), the worker polls
+        and tries again after `max_sleep` seconds.
+        """
+        try:
+            self.listener = get_listener()
+            self._reconnect_at = None
+        except Exception:
+            logger.exception('Could not listen for trigger notifications, polling instead')
+            self.listener = None
+            self._reconnect_at = monotonic() + self.max_sleep
+
+    def close_listener(self):
+        if self.listener is None:
+            return
+        try:
+            self.listener.close()
+        except Exception:
+            logger.exception('Could not close the trigger notification listener')
+        self.listener = None
+
+    def sleep(self, seconds):
+        """
+        Sleep until the worker is stopped or, when listening for notifications, a trigger is created.
+        """
+        if self.listener is None and self._reconnect_at is not None and monotonic() >= self._reconnect_at:
+            self.connect_listener()
+
+        if self.listener is None:
+            self._stopping.wait(seconds)
+            return
+
+        # Signals don't interrupt waiting for a notification, so check for stopping every second
+        deadline = monotonic() + seconds
+        while not self.stopping:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            try:
+                if self.listener.wait(min(remaining, 1)):
+                    return
+            except Exception:
+                logger.exception('Waiting for trigger notifications failed, polling instead')
+                self.close_listener()
+                self._reconnect_at = monotonic() + self.max_sleep
+                self._stopping.wait(max(0, deadline - monotonic()))
+                return
+
+    def get_sleep(self, nr_handled):
+        """
+        Get how many seconds to sleep after handling `nr_handled` triggers, or after an error when it's None.
+        """
+        # Try again soon, without backing off, as there may still be due triggers
+        if nr_handled is None:
+            self.idle_sleep = self.min_sleep
+            return self.min_sleep
+
+        # There are probably more due triggers
+        if nr_handled >= self.batch_size:
+            self.idle_sleep = self.min_sleep
+            return 0
+
+        if nr_handled:
+            self.idle_sleep = self.min_sleep
+            sleep = self.min_sleep
+        else:
+            sleep = self.idle_sleep
+            self.idle_sleep = min(self.idle_sleep * 2, self.max_sleep)
+
+        next_process_after = get_next_process_after()
+        if next_process_after is not None:
+            sleep = min(sleep, (next_process_after - timezone.now()).total_seconds())
+        return max(0, min(sleep, self.max_sleep))
+
+    def _install_signal_handlers(self):
+        """
+        Stop the worker on SIGTERM and SIGINT. Signal handlers can only be installed in the main thread.
+
+        :return: the previous signal handlers
+        :rtype: dict
+        """
+        if current_thread() is not main_thread():
+            return {}
+
+        handlers = {}
+        for signum in (SIGTERM, SIGINT):
+            handlers[signum] = getsignal(signum)
+            signal(signum, self.stop)
+        return handlers